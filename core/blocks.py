@@ -111,6 +111,7 @@ class CardBlock(blocks.StructBlock):
         template = "streams/card_block.html"
         icon = "placeholder"
         label = "Bootstrap Card Deck"
+        filter_specs = ['fill-300x200']
 
 
 class RichTextBlock(blocks.RichTextBlock):
@@ -170,6 +171,7 @@ class ImageCarouselBlock(blocks.StructBlock):
     class Meta:
         template = 'streams/image_carousel.html'
         icon = 'image'
+        filter_specs = ['height-400']
 
 
 # class MarkdownBlock(StreamBlock):
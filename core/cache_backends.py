@@ -0,0 +1,269 @@
+"""On-disk cache backend for the page cache.
+
+Django's FileBasedCache keeps every entry in one flat directory, lists the
+whole directory to cull, and deletes at random once MAX_ENTRIES is hit.
+ShardedFileCache instead:
+
+* spreads entries over ``ab/cd/<md5>.djcache`` subdirectories,
+* keeps a small SQLite index of entry sizes and last access times, so it can
+  evict the least recently used entries once ``MAX_BYTES`` is exceeded
+  without listing any directories,
+* writes entries to a temporary file and renames it into place, so readers
+  never see half-written files,
+* stores HttpResponse bodies gzipped, so a hit can be sent to clients that
+  accept gzip without compressing it again (see core.page_cache).
+"""
+import glob
+import hashlib
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.http import HttpResponse
+from django.utils.text import compress_string
+
+VALUE = 'v'
+RESPONSE = 'r'
+
+
+class ShardedFileCache(BaseCache):
+    cache_suffix = '.djcache'
+    index_name = 'index.sqlite3'
+
+    def __init__(self, dir, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._dir = os.path.abspath(dir)
+        self._max_bytes = int(options.get('MAX_BYTES', 1024 ** 3))
+        # Cull down to this fraction of MAX_BYTES so every set doesn't cull
+        self._cull_target = float(options.get('CULL_TARGET', 0.9))
+        # Access times are written to the index in batches
+        self._flush_interval = float(options.get('ACCESS_FLUSH_INTERVAL', 10))
+        self._local = threading.local()
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._last_flush = time.time()
+        os.makedirs(self._dir, 0o700, exist_ok=True)
+
+    # Index
+
+    def _index(self):
+        # One connection per thread and process; gunicorn forks after import
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                os.path.join(self._dir, self.index_name), timeout=10,
+                isolation_level=None, check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'name TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY, size INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO totals (id, size) VALUES (1, 0)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _index_set(self, name, size):
+        conn = self._index()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT size FROM entries WHERE name = ?', (name,)).fetchone()
+            old_size = row[0] if row else 0
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (name, size, accessed) VALUES (?, ?, ?)',
+                (name, size, time.time()),
+            )
+            conn.execute('UPDATE totals SET size = size + ? WHERE id = 1', (size - old_size,))
+            total = conn.execute('SELECT size FROM totals WHERE id = 1').fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return total
+
+    def _index_delete(self, names):
+        if not names:
+            return
+        conn = self._index()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for name in names:
+                row = conn.execute('SELECT size FROM entries WHERE name = ?', (name,)).fetchone()
+                if row:
+                    conn.execute('DELETE FROM entries WHERE name = ?', (name,))
+                    conn.execute('UPDATE totals SET size = size - ? WHERE id = 1', (row[0],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _touch_access(self, name):
+        now = time.time()
+        with self._touched_lock:
+            self._touched[name] = now
+            if now - self._last_flush < self._flush_interval:
+                return
+            touched, self._touched = self._touched, {}
+            self._last_flush = now
+        self._index().executemany(
+            'UPDATE entries SET accessed = ? WHERE name = ?',
+            [(accessed, name) for name, accessed in touched.items()],
+        )
+
+    def _cull(self, total):
+        """Evict least recently used entries until under the byte budget."""
+        target = self._max_bytes * self._cull_target
+        conn = self._index()
+        while total > target:
+            rows = conn.execute(
+                'SELECT name, size FROM entries ORDER BY accessed LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            for name, size in rows:
+                self._remove_file(self._name_to_path(name))
+                total -= size
+            self._index_delete([name for name, size in rows])
+
+    # Files
+
+    def _key_to_name(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def _name_to_path(self, name):
+        return os.path.join(self._dir, name[:2], name[2:4], name + self.cache_suffix)
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _read(self, path):
+        """Return (kind, payload, body) for a live entry, or None."""
+        try:
+            with open(path, 'rb') as f:
+                expiry, kind = pickle.load(f)
+                if expiry is not None and expiry < time.time():
+                    expired = True
+                else:
+                    expired = False
+                    payload = pickle.load(f)
+                    body = f.read()
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            # Truncated or foreign file; treat it as a miss
+            return None
+        if expired:
+            self._remove_file(path)
+            return None
+        return kind, payload, body
+
+    def _load(self, kind, payload, body):
+        value = pickle.loads(zlib.decompress(payload))
+        if kind == RESPONSE:
+            value.content = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            value.gzipped_content = body
+        return value
+
+    def _write(self, name, value, timeout):
+        path = self._name_to_path(name)
+        os.makedirs(os.path.dirname(path), 0o700, exist_ok=True)
+        expiry = self.get_backend_timeout(timeout)
+        if isinstance(value, HttpResponse):
+            content = value.content
+            value.content = b''
+            try:
+                payload = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            finally:
+                value.content = content
+            kind, body = RESPONSE, compress_string(content)
+        else:
+            payload = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            kind, body = VALUE, b''
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                pickle.dump((expiry, kind), f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(payload, f, pickle.HIGHEST_PROTOCOL)
+                f.write(body)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove_file(tmp_path)
+            raise
+        total = self._index_set(name, size)
+        if total > self._max_bytes:
+            self._cull(total)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        name = self._key_to_name(key, version)
+        entry = self._read(self._name_to_path(name))
+        if entry is None:
+            return default
+        self._touch_access(name)
+        return self._load(*entry)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(self._key_to_name(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version):
+            return False
+        self.set(key, value, timeout, version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key_to_name(key, version)
+        entry = self._read(self._name_to_path(name))
+        if entry is None:
+            return False
+        self._write(name, self._load(*entry), timeout)
+        return True
+
+    def delete(self, key, version=None):
+        name = self._key_to_name(key, version)
+        self._remove_file(self._name_to_path(name))
+        self._index_delete([name])
+
+    def delete_many(self, keys, version=None):
+        names = [self._key_to_name(key, version) for key in keys]
+        for name in names:
+            self._remove_file(self._name_to_path(name))
+        self._index_delete(names)
+
+    def has_key(self, key, version=None):
+        path = self._name_to_path(self._key_to_name(key, version))
+        try:
+            with open(path, 'rb') as f:
+                expiry, kind = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            return False
+        return expiry is None or expiry >= time.time()
+
+    def clear(self):
+        for shard in glob.glob(os.path.join(self._dir, '[0-9a-f][0-9a-f]')):
+            shutil.rmtree(shard, ignore_errors=True)
+        conn = self._index()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM entries')
+        conn.execute('UPDATE totals SET size = 0 WHERE id = 1')
+        conn.execute('COMMIT')
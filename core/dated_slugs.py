@@ -0,0 +1,76 @@
+"""Resolve dated article URLs to pages.
+
+``ArticleIndexPage.post_by_date_slug`` serves ``<index>/<yyyy>/<mm>/<dd>/<slug>/``.
+Each live article has an ArticleSlug row keyed on (index page, date, slug),
+so a URL is one lookup on that unique index. Answers are also remembered in
+a per-process map, including misses, so repeated requests for a popular
+article, or for one that does not exist, cost no query at all.
+
+Publishing, unpublishing, moving or renaming an article bumps a version
+number in the shared cache once its transaction commits. Every process
+compares that number on each lookup and starts a new map when it has
+changed.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'dated_slug:version'
+# Entries per process; the map starts again when it is full
+MAX_ENTRIES = getattr(settings, 'DATED_SLUG_CACHE_SIZE', 10000)
+
+_map = {}
+_version = None
+_lock = threading.Lock()
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, so an evicted version never comes back as
+        # a number some process still has a map for
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_version():
+    """Forget every remembered answer, in every process, once the change commits.
+
+    Bumping any earlier would let another process look the URL up before
+    the commit and remember the old answer under the new version.
+    """
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def resolve(index_page_id, post_date, slug):
+    """The id of the live article at this dated URL, or None."""
+    from core.models import ArticleSlug
+
+    global _map, _version
+    key = (index_page_id, post_date, slug)
+    version = get_version()
+    with _lock:
+        if version != _version or len(_map) >= MAX_ENTRIES:
+            _map = {}
+            _version = version
+        if key in _map:
+            return _map[key]
+    page_id = ArticleSlug.objects.filter(
+        index_page_id=index_page_id, date=post_date, slug=slug,
+    ).values_list('card_id', flat=True).first()
+    with _lock:
+        if _version == version:
+            # None is remembered too, as a negative entry
+            _map[key] = page_id
+    return page_id
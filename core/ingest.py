@@ -0,0 +1,92 @@
+"""Normalise uploaded image originals before they are stored.
+
+Camera originals are often several thousand pixels across, carry EXIF
+orientation instead of upright pixels, and embed large metadata blocks. Every
+rendition decodes the whole master, so CustomImage runs each new upload
+through ``normalise_image`` first:
+
+* JPEGs are decoded with Pillow's draft mode, which lets libjpeg scale by
+  1/2, 1/4 or 1/8 while decoding, so memory use tracks the output size and
+  not the camera's resolution;
+* EXIF orientation is applied to the pixels;
+* the longest edge is capped at ``MAX_EDGE`` pixels;
+* the result is re-encoded (progressive JPEG, or PNG when there is
+  transparency) without any metadata.
+
+GIFs are stored untouched so animations survive.
+
+``placeholder_data_uri`` makes the tiny blurred preview stored on each image
+(CustomImage.placeholder), which listings inline while the real image loads.
+"""
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+IMAGE_INGEST = getattr(settings, 'IMAGE_INGEST', {})
+MAX_EDGE = IMAGE_INGEST.get('MAX_EDGE', 2560)
+JPEG_QUALITY = IMAGE_INGEST.get('JPEG_QUALITY', 88)
+# Formats stored as uploaded
+KEEP_FORMATS = {'GIF'}
+# Longest edge of the inlined placeholder; browsers scale it up blurred
+PLACEHOLDER_EDGE = IMAGE_INGEST.get('PLACEHOLDER_EDGE', 16)
+PLACEHOLDER_QUALITY = 50
+
+
+def content_hash(file):
+    """SHA-1 of a file's contents, read in chunks (same as Image.file_hash)."""
+    digest = hashlib.sha1()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def normalise_image(file):
+    """Return a normalised ContentFile for an uploaded image, or None to keep it."""
+    file.seek(0)
+    with Image.open(file) as image:
+        if image.format in KEEP_FORMATS:
+            file.seek(0)
+            return None
+        if image.format == 'JPEG':
+            # Ask libjpeg for the smallest scale that still covers MAX_EDGE
+            image.draft('RGB', (MAX_EDGE, MAX_EDGE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_EDGE, MAX_EDGE), Image.LANCZOS)
+
+        output = BytesIO()
+        has_alpha = image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            extension = '.png'
+            image.save(output, 'PNG', optimize=True)
+        else:
+            extension = '.jpg'
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    file.seek(0)
+    name = os.path.splitext(os.path.basename(file.name))[0] + extension
+    return ContentFile(output.getvalue(), name=name)
+
+
+def placeholder_data_uri(file):
+    """A few hundred bytes of JPEG, as a data: URI, previewing the image."""
+    file.seek(0)
+    with Image.open(file) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', (PLACEHOLDER_EDGE * 8, PLACEHOLDER_EDGE * 8))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE), Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    file.seek(0)
+    return 'data:image/jpeg;base64,' + base64.b64encode(output.getvalue()).decode()
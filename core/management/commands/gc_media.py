@@ -0,0 +1,239 @@
+import os
+import posixpath
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+
+from core.models import ArticleCard, RenderedBody
+from core.renditions import RENDITION_SPECS, regeneration_paused
+
+# Where Wagtail's upload_to functions put originals and renditions
+ORIGINALS_DIR = 'original_images'
+RENDITIONS_DIR = 'images'
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# A media URL inside an src or srcset attribute
+re_media_url = re.compile(re.escape(settings.MEDIA_URL) + r'[^\s"\',]+')
+
+
+def parse_size(value):
+    """'500M' -> bytes."""
+    value = value.strip().upper().rstrip('B')
+    unit = value[-1:] if value[-1:] in UNITS else ''
+    try:
+        return int(float(value[:len(value) - len(unit)]) * UNITS[unit])
+    except ValueError:
+        raise CommandError("Can't read size {!r}; use e.g. 500M or 2G.".format(value))
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '{:.0f} {}'.format(size, unit)
+        size /= 1024
+    return '{:.1f} GB'.format(size)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete renditions for unregistered filter specs or old focal points, "
+        "rendition rows whose file is gone, and media files nothing refers to. "
+        "With --max-bytes, also evict the least recently used renditions until "
+        "the rendition directory fits the budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report what would be deleted without deleting anything.",
+        )
+        parser.add_argument(
+            '--max-bytes', type=parse_size,
+            help="Budget for rendition files, e.g. 2G.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Rows deleted per query (default 500).",
+        )
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help="Leave unreferenced files younger than this many seconds, "
+                 "which may belong to an upload in progress (default 3600).",
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.counts = Counter()
+        self.sizes = Counter()
+
+        Image = get_image_model()
+        Rendition = Image.get_rendition_model()
+        on_disk = self.scan(RENDITIONS_DIR)
+        in_use = self.stored_urls()
+
+        # Sort every rendition row into stale, missing or live
+        stale, missing, live, kept = [], [], [], []
+        filters = {}
+        renditions = Rendition.objects.select_related('image').only(
+            'id', 'file', 'webp', 'filter_spec', 'focal_point_key',
+            'image__id', 'image__focal_point_x', 'image__focal_point_y',
+            'image__focal_point_width', 'image__focal_point_height',
+        )
+        for rendition in renditions.iterator():
+            spec = rendition.filter_spec
+            if spec not in filters:
+                filters[spec] = Filter(spec=spec)
+            if spec not in RENDITION_SPECS:
+                reason = 'unregistered spec'
+            elif rendition.focal_point_key != filters[spec].get_cache_key(rendition.image):
+                reason = 'old focal point'
+            else:
+                reason = None
+            if reason and self.is_stored(rendition, in_use):
+                # Not rebuilt yet; deleting it would break the stored HTML
+                kept.append(rendition)
+            elif reason:
+                stale.append((reason, rendition))
+            elif rendition.file.name not in on_disk:
+                missing.append(rendition)
+            else:
+                live.append(rendition)
+
+        # Rows for deliberately dropped renditions; Wagtail deletes their files
+        with regeneration_paused():
+            for reason, rendition in stale:
+                self.count(reason, self.rendition_size(rendition, on_disk))
+            self.delete_rows(Rendition, [rendition.pk for reason, rendition in stale])
+
+        # Rows whose file has gone are deleted and made again when next used
+        with regeneration_paused():
+            for rendition in missing:
+                self.count('file missing', 0)
+            self.delete_rows(Rendition, [rendition.pk for rendition in missing])
+
+        # Files no row refers to (deleted images, interrupted writes, ...)
+        referenced = set()
+        for reason, rendition in stale:
+            referenced.update((rendition.file.name, rendition.webp.name))
+        for rendition in live + kept:
+            referenced.update((rendition.file.name, rendition.webp.name))
+        self.delete_orphans(on_disk, referenced, options['grace'], 'orphaned rendition file')
+
+        originals = self.scan(ORIGINALS_DIR)
+        referenced = set(Image.objects.values_list('file', flat=True))
+        self.delete_orphans(originals, referenced, options['grace'], 'orphaned original')
+
+        if options['max_bytes'] is not None:
+            self.enforce_budget(Rendition, live, on_disk, in_use, options['max_bytes'])
+
+        self.report()
+
+    def scan(self, directory):
+        """{storage name: (size, last used timestamp)} for every file below ``directory``."""
+        found = {}
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            try:
+                dirs, files = default_storage.listdir(path)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            pending.extend(posixpath.join(path, name) for name in dirs)
+            for name in files:
+                name = posixpath.join(path, name)
+                found[name] = (default_storage.size(name), self.last_used(name))
+        return found
+
+    def stored_urls(self):
+        """Rendition URLs written into ArticleCards and RenderedBodies.
+
+        Those rows are not re-rendered when gc_media deletes a rendition, so
+        the renditions they show are left alone.
+        """
+        urls = set()
+        for image_url, image_index_url in ArticleCard.objects.values_list(
+                'image_url', 'image_index_url').iterator():
+            urls.update((image_url, image_index_url))
+        for html in RenderedBody.objects.values_list('html', flat=True).iterator():
+            urls.update(re_media_url.findall(html))
+        urls.discard('')
+        return urls
+
+    def is_stored(self, rendition, in_use):
+        return any(
+            field and field.url in in_use for field in (rendition.file, rendition.webp)
+        )
+
+    def last_used(self, name):
+        # Access times where the filesystem keeps them (relatime updates
+        # them at least daily), else modification times
+        try:
+            stat = os.stat(default_storage.path(name))
+            return max(stat.st_atime, stat.st_mtime)
+        except NotImplementedError:
+            return default_storage.get_modified_time(name).timestamp()
+
+    def rendition_size(self, rendition, on_disk):
+        return sum(
+            on_disk[name][0] for name in (rendition.file.name, rendition.webp.name)
+            if name in on_disk
+        )
+
+    def count(self, reason, size):
+        self.counts[reason] += 1
+        self.sizes[reason] += size
+
+    def delete_rows(self, Rendition, ids):
+        if self.dry_run:
+            return
+        for start in range(0, len(ids), self.batch_size):
+            # Per-object deletes, so the file clean-up signal handlers run
+            Rendition.objects.filter(pk__in=ids[start:start + self.batch_size]).delete()
+
+    def delete_orphans(self, on_disk, referenced, grace, reason):
+        cutoff = time.time() - grace
+        for name, (size, last_used) in sorted(on_disk.items()):
+            if name in referenced or last_used > cutoff:
+                continue
+            self.count(reason, size)
+            if not self.dry_run:
+                default_storage.delete(name)
+
+    def enforce_budget(self, Rendition, live, on_disk, in_use, max_bytes):
+        total = sum(self.rendition_size(rendition, on_disk) for rendition in live)
+        if total <= max_bytes:
+            return
+        live.sort(key=lambda rendition: on_disk[rendition.file.name][1])
+        evicted = []
+        for rendition in live:
+            if total <= max_bytes:
+                break
+            if self.is_stored(rendition, in_use):
+                continue
+            size = self.rendition_size(rendition, on_disk)
+            total -= size
+            self.count('over budget (least recently used)', size)
+            evicted.append(rendition.pk)
+        # They are generated again when a page next needs them
+        with regeneration_paused():
+            self.delete_rows(Rendition, evicted)
+
+    def report(self):
+        if not self.counts:
+            self.stdout.write(self.style.SUCCESS("Nothing to collect."))
+            return
+        for reason, count in self.counts.most_common():
+            self.stdout.write("{:<36} {:>7} {:>12}".format(
+                reason, count, format_size(self.sizes[reason])))
+        verb = "Would reclaim" if self.dry_run else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS("{} {}.".format(
+            verb, format_size(sum(self.sizes.values())))))
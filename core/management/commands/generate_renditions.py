@@ -0,0 +1,40 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from wagtail.images import get_image_model
+
+from core.renditions import RENDITION_SPECS, generate_renditions, make_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate every rendition in core.renditions.RENDITION_SPECS for the "
+        "whole image library, spread over several processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of processes (default: one per CPU).",
+        )
+
+    def handle(self, *args, **options):
+        image_ids = list(get_image_model().objects.order_by('-pk').values_list('pk', flat=True))
+        connections.close_all()
+        self.stdout.write("Rendering {} specs for {} images...".format(
+            len(RENDITION_SPECS), len(image_ids)))
+
+        start = time.monotonic()
+        failed = 0
+        with make_pool(options['workers']) as pool:
+            for done, errors in enumerate(pool.map(generate_renditions, image_ids, chunksize=8), 1):
+                failed += errors
+                if done % 100 == 0:
+                    self.stdout.write("{} / {}".format(done, len(image_ids)))
+
+        if failed:
+            self.stderr.write("{} renditions could not be generated; see the log.".format(failed))
+        self.stdout.write(self.style.SUCCESS("Done in {:.1f}s.".format(time.monotonic() - start)))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.page_cache import get_stats
+
+
+class Command(BaseCommand):
+    help = "Show page cache hit, miss and stale counts across all workers."
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = sum(stats.values()) or 1
+        for name in ('hit', 'stale', 'miss'):
+            self.stdout.write("{:>6}: {:>10} ({:.1%})".format(name, stats[name], stats[name] / total))
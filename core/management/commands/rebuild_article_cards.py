@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ArticleCard, ArticlePage
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ArticleCard listing rows for every live article."
+
+    def handle(self, *args, **options):
+        live_pages = ArticlePage.objects.live()
+        ArticleCard.objects.exclude(page__in=live_pages).delete()
+        count = 0
+        for page in live_pages.iterator():
+            ArticleCard.build(page)
+            count += 1
+        self.stdout.write(self.style.SUCCESS("Rebuilt {} article cards.".format(count)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ArticlePage, RenderedBody
+
+
+class Command(BaseCommand):
+    help = "Render the stored body HTML for every live article (run after template changes)."
+
+    def handle(self, *args, **options):
+        live_pages = ArticlePage.objects.live()
+        RenderedBody.objects.exclude(page__in=live_pages).delete()
+        count = failed = 0
+        for page in live_pages.iterator():
+            if RenderedBody.render(page) is None:
+                failed += 1
+            else:
+                count += 1
+        self.stdout.write(self.style.SUCCESS("Rendered {} article bodies.".format(count)))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                "{} bodies failed to render and are rendered per request; see the log.".format(failed)))
@@ -0,0 +1,163 @@
+import io
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from core.models import ArticleIndexPage, ArticlePage
+from core.pagination import NUMBERED_PAGES
+from home.models import HomePage
+from people.models import PersonPage, StaffPage, YearsActive
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the live page tree into the page cache, most important "
+        "pages first, so visitors after a deploy or cache clear get hits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Number of pages rendered at the same time (default 4).",
+        )
+        parser.add_argument(
+            '--budget', type=float, default=600,
+            help="Stop starting new renders after this many seconds (default 600).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="List the URLs that would be warmed without rendering them.",
+        )
+
+    def handle(self, *args, **options):
+        urls = self.get_urls()
+        if options['dry_run']:
+            for priority, page_type, url in urls:
+                self.stdout.write("{:<14} {}".format(page_type, url))
+            self.stdout.write("{} URLs.".format(len(urls)))
+            return
+
+        self.application = get_wsgi_application()
+        self.deadline = time.monotonic() + options['budget']
+        timings = defaultdict(list)
+        errors = []
+        skipped = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = pool.map(self.render, urls)
+            for (priority, page_type, url), result in zip(urls, results):
+                if result is None:
+                    skipped += 1
+                    continue
+                status, seconds = result
+                timings[page_type].append(seconds)
+                if status != 200:
+                    errors.append((status, url))
+
+        self.write_summary(timings, errors, skipped)
+
+    def get_urls(self):
+        """Return (priority, page type, url) tuples, most important first."""
+        urls = []
+
+        def add(priority, page_type, url, pages=1):
+            if not url:
+                return
+            urls.append((priority, page_type, url))
+            for number in range(2, pages + 1):
+                urls.append((priority, page_type, '{}?page={}'.format(url, number)))
+
+        for page in HomePage.objects.live():
+            add(0, 'HomePage', page.full_url, NUMBERED_PAGES)
+
+        for index in ArticleIndexPage.objects.live():
+            add(1, 'ArticleIndexPage', index.full_url, NUMBERED_PAGES)
+
+        # Newest articles first (the sort below is stable)
+        articles = ArticlePage.objects.live().order_by('-date', '-pk')
+        for page in articles:
+            add(2, 'ArticlePage', page.full_url)
+
+        for page in StaffPage.objects.live():
+            add(3, 'StaffPage', page.full_url)
+            for year in YearsActive.objects.all():
+                add(3, 'StaffPage', '{}year/{}/'.format(page.full_url, year.year_string))
+
+        for page in PersonPage.objects.live():
+            add(4, 'PersonPage', page.full_url)
+
+        # post_by_date archive routes on each index, newest first
+        dates = articles.order_by('-date').values_list('date', flat=True).distinct()
+        for index in ArticleIndexPage.objects.live():
+            seen = set()
+            for day in dates:
+                for route in ('{:%Y}/', '{:%Y/%m}/', '{:%Y/%m/%d}/'):
+                    path = route.format(day)
+                    if path not in seen:
+                        seen.add(path)
+                        add(5, 'post_by_date', index.full_url + path)
+
+        urls.sort(key=lambda item: item[0])
+        return urls
+
+    def render(self, item):
+        priority, page_type, url = item
+        if time.monotonic() > self.deadline:
+            return None
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': parts.path or '/',
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': parts.hostname,
+            'SERVER_PORT': str(port),
+            'HTTP_HOST': parts.netloc,
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scheme,
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+
+        start = time.monotonic()
+        response = self.application(environ, start_response)
+        try:
+            for chunk in response:
+                pass
+        finally:
+            # Sends request_finished, which closes this thread's DB connection
+            if hasattr(response, 'close'):
+                response.close()
+        return status[0], time.monotonic() - start
+
+    def write_summary(self, timings, errors, skipped):
+        self.stdout.write("{:<18} {:>6} {:>9} {:>9} {:>9}".format(
+            'Page type', 'Pages', 'Mean ms', 'Max ms', 'Total s'))
+        for page_type, seconds in timings.items():
+            self.stdout.write("{:<18} {:>6} {:>9.1f} {:>9.1f} {:>9.2f}".format(
+                page_type, len(seconds),
+                1000 * sum(seconds) / len(seconds),
+                1000 * max(seconds),
+                sum(seconds),
+            ))
+        for status, url in errors:
+            self.stderr.write("{} {}".format(status, url))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                "Time budget ran out; {} URLs were not warmed.".format(skipped)))
+        self.stdout.write(self.style.SUCCESS("Warmed {} URLs.".format(
+            sum(len(seconds) for seconds in timings.values()))))
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2019-09-21 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_basepage_sub_title'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='basepage',
+            index=models.Index(fields=['date', 'page_ptr'], name='core_basepage_date_id'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.5 on 2019-09-21 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_basepage_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleCard',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='core.ArticlePage')),
+                ('title', models.CharField(max_length=255)),
+                ('url', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('sub_title', models.CharField(blank=True, max_length=500)),
+                ('excerpt', models.TextField(blank=True)),
+                ('image_url', models.CharField(blank=True, max_length=255)),
+                ('image_index_url', models.CharField(blank=True, max_length=255)),
+                ('image_alt', models.CharField(blank=True, max_length=255)),
+                ('is_public', models.BooleanField(default=True)),
+                ('categories_json', models.TextField(default='[]')),
+                ('authors_json', models.TextField(default='[]')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='articlecard',
+            index=models.Index(fields=['date', 'page'], name='core_articlecard_date_id'),
+        ),
+    ]
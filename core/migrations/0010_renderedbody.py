@@ -0,0 +1,25 @@
+# Generated by Django 2.2.5 on 2019-09-21 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0041_group_collection_permissions_verbose_name_plural'),
+        ('core', '0009_articlecard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedBody',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rendered_body', serialize=False, to='core.ArticlePage')),
+                ('html', models.TextField(blank=True)),
+                ('excerpt', models.TextField(blank=True)),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('revision', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailcore.PageRevision')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.5 on 2019-09-28 11:20
+
+from django.db import migrations, models
+import wagtail.images.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_renderedbody'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customrendition',
+            name='webp',
+            field=models.FileField(blank=True, upload_to=wagtail.images.models.get_rendition_upload_to),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.5 on 2019-09-29 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_customrendition_webp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='articlecard',
+            name='image_placeholder',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.5 on 2019-10-02 18:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0002_auto_20190918_2333'),
+        ('core', '0012_placeholders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorArticle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_articles', to='core.ArticleCard')),
+                ('person_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='people.PersonPage')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='authorarticle',
+            index=models.Index(fields=['person_page', 'date', 'id'], name='core_authorarticle_person_date'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='authorarticle',
+            unique_together={('person_page', 'card')},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.5 on 2019-10-04 20:47
+
+import json
+
+from django.db import migrations, models
+
+
+def fill_archive(apps, schema_editor):
+    ArticleCard = apps.get_model('core', 'ArticleCard')
+    ArchiveDay = apps.get_model('core', 'ArchiveDay')
+    days = {}
+    for page_id, day in ArticleCard.objects.order_by('-pk').values_list('pk', 'date'):
+        days.setdefault(day, []).append(page_id)
+    ArchiveDay.objects.bulk_create([
+        ArchiveDay(
+            date=day, year=day.year, month=day.month, day=day.day,
+            count=len(ids), page_ids_json=json.dumps(ids),
+        )
+        for day, ids in days.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_authorarticle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('day', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('page_ids_json', models.TextField(default='[]')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archiveday',
+            index=models.Index(fields=['year', 'month'], name='core_archiveday_year_month'),
+        ),
+        migrations.RunPython(fill_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.5 on 2019-10-06 14:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_slugs(apps, schema_editor):
+    ArticleCard = apps.get_model('core', 'ArticleCard')
+    ArticleSlug = apps.get_model('core', 'ArticleSlug')
+    Page = apps.get_model('wagtailcore', 'Page')
+    cards = list(ArticleCard.objects.values_list('pk', 'date', 'page__slug', 'page__path'))
+    # Treebeard paths use four characters per level
+    parents = dict(
+        Page.objects.filter(path__in={path[:-4] for pk, day, slug, path in cards})
+        .values_list('path', 'pk')
+    )
+    ArticleSlug.objects.bulk_create([
+        ArticleSlug(card_id=pk, index_page_id=parents[path[:-4]], date=day, slug=slug)
+        for pk, day, slug, path in cards
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0041_group_collection_permissions_verbose_name_plural'),
+        ('core', '0014_archiveday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSlug',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dated_slug', serialize=False, to='core.ArticleCard')),
+                ('date', models.DateField()),
+                ('slug', models.SlugField(allow_unicode=True, max_length=255)),
+                ('index_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.Page')),
+            ],
+            options={
+                'unique_together': {('index_page', 'date', 'slug')},
+            },
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2019-10-08 10:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_articleslug'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='renderedbody',
+            name='excerpt',
+        ),
+    ]
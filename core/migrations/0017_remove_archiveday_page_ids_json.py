@@ -0,0 +1,17 @@
+# Generated by Django 2.2.5 on 2019-10-09 09:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_remove_renderedbody_excerpt'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='archiveday',
+            name='page_ids_json',
+        ),
+    ]
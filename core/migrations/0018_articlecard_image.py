@@ -0,0 +1,27 @@
+# Generated by Django 2.2.5 on 2019-10-09 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_card_images(apps, schema_editor):
+    ArticleCard = apps.get_model('core', 'ArticleCard')
+    for card in ArticleCard.objects.select_related('page'):
+        if card.page.main_image_id:
+            ArticleCard.objects.filter(pk=card.pk).update(image_id=card.page.main_image_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_remove_archiveday_page_ids_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlecard',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.CustomImage'),
+        ),
+        migrations.RunPython(fill_card_images, migrations.RunPython.noop),
+    ]
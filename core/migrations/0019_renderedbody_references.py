@@ -0,0 +1,25 @@
+# Generated by Django 2.2.5 on 2019-10-10 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Existing bodies get their references on the next render_article_bodies
+
+    dependencies = [
+        ('wagtailcore', '0041_group_collection_permissions_verbose_name_plural'),
+        ('core', '0018_articlecard_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renderedbody',
+            name='images',
+            field=models.ManyToManyField(blank=True, related_name='_renderedbody_images_+', to='core.CustomImage'),
+        ),
+        migrations.AddField(
+            model_name='renderedbody',
+            name='linked_pages',
+            field=models.ManyToManyField(blank=True, related_name='_renderedbody_linked_pages_+', to='wagtailcore.Page'),
+        ),
+    ]
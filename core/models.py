@@ -1,13 +1,35 @@
-from datetime import datetime
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from io import BytesIO
+
+from PIL import Image as PILImage, features
+
 # Django imports
-from django.db import models
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.http import Http404
+from django.utils.dateformat import DateFormat
+from django.utils.formats import date_format
+from django.utils.functional import cached_property
+from django.utils.html import strip_tags
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
 from modelcluster.fields import ParentalManyToManyField, ParentalKey
 from django.forms import CheckboxSelectMultiple
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 
 # Wagtail core imports
 from wagtail.core.blocks import (BlockQuoteBlock, CharBlock, ListBlock,
-                                 RawHTMLBlock)
+                                 RawHTMLBlock, StructValue)
+from wagtail.core.rich_text import RichText
+from wagtail.core.signals import page_published, page_unpublished
 from wagtail.core.models import Page, Orderable
 from wagtail.core.fields import StreamField
 from wagtail.admin.edit_handlers import (
@@ -21,7 +43,8 @@ from wagtail.admin.edit_handlers import (
 )
 from wagtail.snippets.models import register_snippet
 from wagtail.snippets.edit_handlers import SnippetChooserPanel
-from wagtail.images.models import AbstractImage, AbstractRendition, Image
+from wagtail.images.models import (AbstractImage, AbstractRendition, Filter, Image,
+                                    get_rendition_upload_to)
 from wagtail.images.edit_handlers import ImageChooserPanel
 
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
@@ -29,11 +52,21 @@ from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 # Extension imports
 
 # Local imports
+from core import dated_slugs
 from core.blocks import (ButtonBlock, CardBlock, CenteredTitle,
                          CTABlock, ImageCarouselBlock,
                          ImageChooserBlock, RichTextBlock, SimpleRichTextBlock,
                          TitleAndTextBlock, ImageFormatChoiceBlock, ImageBlock,
                          TitleWithBreak, BlockQuote)
+from core.pagination import paginate_by_date
+from core.page_cache import depends_on, page_tag, purge
+from core.ingest import content_hash, normalise_image, placeholder_data_uri
+from core.prefetch import clear_page_links, prefetch_stream, stream_references
+from core.renditions import (RENDITION_SPECS, cache_rendition, forget_rendition,
+                             get_cached_rendition, is_regeneration_paused,
+                             queue_renditions)
+
+logger = logging.getLogger(__name__)
 
 @register_snippet
 class ArticleCategory(models.Model):
@@ -69,12 +102,55 @@ class ArticleCategoryOrderable(Orderable):
 class CustomImage(AbstractImage):
     caption = models.CharField(max_length=255, blank=True)
     credit = models.CharField(max_length=255, blank=True)
+    # Tiny preview inlined by listings while the image loads (a data: URI)
+    placeholder = models.TextField(blank=True, editable=False)
 
     admin_form_fields = Image.admin_form_fields + (
         'credit',
         'caption',
     )
 
+    def clean(self):
+        super().clean()
+        if self.file and not self.file._committed:
+            self.file_hash = content_hash(self.file)
+            duplicate = CustomImage.objects.filter(
+                file_hash=self.file_hash).exclude(pk=self.pk).first()
+            if duplicate:
+                raise ValidationError({'file': 'This image has already been uploaded as "{}".'.format(
+                    duplicate.title)})
+
+    def save(self, *args, **kwargs):
+        # New uploads are stored normalised; file_hash stays the hash of the
+        # uploaded bytes, so a second upload of the same file is recognised.
+        if self.file and not self.file._committed:
+            if not self.file_hash:
+                self.file_hash = content_hash(self.file)
+            normalised = normalise_image(self.file)
+            if normalised is not None:
+                self.file = normalised
+                self.file_size = normalised.size
+            self.placeholder = placeholder_data_uri(self.file)
+        super().save(*args, **kwargs)
+
+    def get_rendition(self, filter):
+        # core.prefetch attaches renditions fetched in bulk for a whole
+        # StreamField, and every worker shares renditions it has looked up
+        # through the cache; use both before asking the database.
+        if isinstance(filter, str):
+            filter = Filter(spec=filter)
+        key = (filter.spec, filter.get_cache_key(self))
+        prefetched = getattr(self, 'prefetched_renditions', None)
+        if prefetched is not None and key in prefetched:
+            return prefetched[key]
+        rendition = get_cached_rendition(self, *key)
+        if rendition is None:
+            rendition = super().get_rendition(filter)
+            cache_rendition(rendition)
+        if prefetched is not None:
+            prefetched[key] = rendition
+        return rendition
+
     @property
     def caption_text(self):
         return self.caption
@@ -90,12 +166,60 @@ class CustomRendition(AbstractRendition):
         on_delete=models.CASCADE,
         related_name='renditions'
         )
+    # WebP copy of ``file`` for browsers that accept it; see make_webp()
+    webp = models.FileField(upload_to=get_rendition_upload_to, blank=True)
 
     class Meta:
         unique_together = (
             ('image', 'filter_spec', 'focal_point_key'),
         )
 
+    def make_webp(self, quality=80):
+        """Save a WebP encoding of this rendition next to the JPEG/PNG."""
+        if not features.check('webp'):
+            return
+        with self.file.open('rb') as f:
+            with PILImage.open(f) as source:
+                source.load()
+                output = BytesIO()
+                source.save(output, 'WEBP', quality=quality, method=6)
+        name = os.path.splitext(os.path.basename(self.file.name))[0] + '.webp'
+        self.webp.save(name, ContentFile(output.getvalue()), save=False)
+        self.save(update_fields=['webp'])
+        cache_rendition(self)
+
+@receiver(post_save, sender=ArticleCategory)
+@receiver(post_delete, sender=ArticleCategory)
+def purge_category_pages(sender, instance, **kwargs):
+    purge('category:{}'.format(instance.slug), 'article_list')
+
+
+@receiver(post_save, sender=CustomImage)
+@receiver(post_delete, sender=CustomImage)
+def purge_image_pages(sender, instance, **kwargs):
+    purge('image:{}'.format(instance.pk))
+
+
+@receiver(post_save, sender=CustomImage)
+def generate_image_renditions(sender, instance, **kwargs):
+    queue_renditions(instance.pk)
+
+
+@receiver(post_delete, sender=CustomRendition)
+def delete_webp_file(sender, instance, **kwargs):
+    # Wagtail removes the rendition's main file the same way
+    if instance.webp:
+        transaction.on_commit(lambda: instance.webp.delete(save=False))
+
+
+@receiver(post_delete, sender=CustomRendition)
+def regenerate_rendition(sender, instance, **kwargs):
+    forget_rendition(instance)
+    # Replacing an image's file deletes its renditions after saving it
+    if instance.filter_spec in RENDITION_SPECS:
+        queue_renditions(instance.image_id)
+
+
 class Author(Orderable):
     page = ParentalKey('BasePage', related_name='authors')
     author = models.ForeignKey(
@@ -140,6 +264,12 @@ class BasePage(Page):
         ),
     ]
 
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination in core.pagination
+            models.Index(fields=['date', 'page_ptr'], name='core_basepage_date_id'),
+        ]
+
     article_panels = [
         FieldPanel('allow_comments'),
         InlinePanel('authors', label="Author"),
@@ -199,8 +329,572 @@ class ArticlePage(BasePage):
         ]
     )
 
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        # Live pages use the HTML rendered when they were published. Previews
+        # show unsaved content, so they always render the blocks.
+        depends_on(page_tag(self.pk))
+        if self.main_image_id:
+            depends_on('image:{}'.format(self.main_image_id))
+        depends_on(*('person:{}'.format(pk) for pk in self.authors.values_list('author_id', flat=True)))
+        rendered = None
+        if not getattr(request, 'is_preview', False):
+            rendered = RenderedBody.objects.filter(page_id=self.pk).first()
+        if rendered:
+            context['rendered_body'] = mark_safe(rendered.html)
+        else:
+            # Body with every image, rendition and linked page fetched up front
+            context['body'] = prefetch_stream(self.body, request)
+        return context
+
+    def render_body(self):
+        """Render every body block to a single HTML string."""
+        context = {'page': self}
+        return ''.join(
+            block.render_as_block(context=context)
+            for block in prefetch_stream(self.body)
+        )
+
+    def get_excerpt(self, length=350):
+        """Plain text from the start of the body, for listings."""
+        parts = []
+        for block in self.body or []:
+            value = block.value
+            if isinstance(value, RichText):
+                parts.append(value.source)
+            elif isinstance(value, StructValue):
+                parts.extend(
+                    value[name].source if isinstance(value[name], RichText) else value[name]
+                    for name in ('text', 'subtitle')
+                    if value.get(name)
+                )
+            elif isinstance(value, str) and block.block_type != 'HTML':
+                parts.append(value)
+        text = ' '.join(strip_tags(part) for part in parts)
+        return Truncator(' '.join(text.split())).chars(length)
+
+
+class ArticleCard(models.Model):
+    """Read-optimised copy of everything an article listing shows.
+
+    Rows are rebuilt whenever an ArticlePage is published and removed when it
+    is unpublished, so listings render from a single query on this table with
+    no .specific upcasts, author joins or rendition lookups. Only live
+    articles have a card.
+    """
+
+    page = models.OneToOneField(
+        'ArticlePage',
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='card',
+    )
+    title = models.CharField(max_length=255)
+    url = models.CharField(max_length=255)
+    date = models.DateField()
+    sub_title = models.CharField(max_length=500, blank=True)
+    excerpt = models.TextField(blank=True)
+    # Kept so the card is rebuilt when the image or its renditions change
+    image = models.ForeignKey(
+        'CustomImage',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    image_url = models.CharField(max_length=255, blank=True)
+    image_index_url = models.CharField(max_length=255, blank=True)
+    image_alt = models.CharField(max_length=255, blank=True)
+    image_placeholder = models.TextField(blank=True)
+    # False when the page or one of its ancestors has a view restriction
+    is_public = models.BooleanField(default=True)
+    # JSON lists of {"slug", "name"} and {"name", "url"}
+    categories_json = models.TextField(default='[]')
+    authors_json = models.TextField(default='[]')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'page'], name='core_articlecard_date_id'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @cached_property
+    def categories(self):
+        return json.loads(self.categories_json)
+
+    @cached_property
+    def authors(self):
+        return json.loads(self.authors_json)
+
+    @classmethod
+    def build(cls, page):
+        """Create or refresh the card for a live ArticlePage."""
+        old_date = cls.objects.filter(page=page).values_list('date', flat=True).first()
+        image = page.main_image
+        if image:
+            card_image = image.get_rendition('fill-300x200')
+            index_image = image.get_rendition('fill-340x240')
+        categories = [
+            {'slug': item.article_category.slug, 'name': item.article_category.name}
+            for item in page.article_categories.select_related('article_category')
+            if item.article_category
+        ]
+        authors = [
+            {
+                'name': item.author.name,
+                'url': item.author.person_page.url if item.author.person_page else '',
+            }
+            for item in page.authors.select_related('author__person_page')
+        ]
+        card, _ = cls.objects.update_or_create(
+            page=page,
+            defaults={
+                'title': page.title,
+                'url': page.url or '',
+                'date': page.date,
+                'sub_title': page.sub_title,
+                'excerpt': page.get_excerpt(),
+                'image': image,
+                'image_url': card_image.url if image else '',
+                'image_index_url': index_image.url if image else '',
+                'image_alt': image.default_alt_text if image else '',
+                'image_placeholder': image.placeholder if image else '',
+                'is_public': not page.get_view_restrictions().exists(),
+                'categories_json': json.dumps(categories),
+                'authors_json': json.dumps(authors),
+            },
+        )
+        removed = AuthorArticle.sync(card)
+        # purge_cached_page only reaches the article's current authors
+        purge(*(page_tag(pk) for pk in removed))
+        ArchiveDay.refresh(old_date, card.date)
+        ArticleSlug.sync(card, page)
+        return card
+
+
+def card_image_tags(cards):
+    """Page cache tags for the images shown by a listing of ArticleCards."""
+    return ['image:{}'.format(card.image_id) for card in cards if card.image_id]
+
+
+_rebuilds = threading.local()
+
+
+def _pending_rebuilds():
+    if not hasattr(_rebuilds, 'cards'):
+        _rebuilds.cards, _rebuilds.bodies, _rebuilds.tags = set(), set(), set()
+    return _rebuilds
+
+
+def rebuild_stored(cards=(), bodies=(), tags=()):
+    """Rebuild ArticleCards and RenderedBodies of these pages, then purge ``tags``.
+
+    Runs once the change commits. Changes made in one transaction are
+    rebuilt together by whichever of its callbacks runs first.
+    """
+    pending = _pending_rebuilds()
+    pending.cards.update(cards)
+    pending.bodies.update(bodies)
+    pending.tags.update(tags)
+    transaction.on_commit(_run_rebuilds)
+
+
+def _run_rebuilds():
+    pending = _pending_rebuilds()
+    cards, bodies, tags = set(pending.cards), set(pending.bodies), set(pending.tags)
+    pending.cards.clear()
+    pending.bodies.clear()
+    pending.tags.clear()
+    for page in ArticlePage.objects.live().filter(pk__in=cards):
+        ArticleCard.build(page)
+    for page in ArticlePage.objects.live().filter(pk__in=bodies):
+        RenderedBody.render(page)
+    tags.update(page_tag(pk) for pk in bodies)
+    if tags:
+        purge(*tags)
 
-class ArticleIndexPage(Page):
+
+def rebuild_image_users(image_id):
+    """Rebuild the cards and bodies showing ``image_id``, whose rendition URLs may be gone."""
+    cards = list(ArticleCard.objects.filter(image_id=image_id).values_list('pk', flat=True))
+    bodies = list(RenderedBody.objects.filter(images=image_id).values_list('page_id', flat=True))
+    if cards or bodies:
+        rebuild_stored(cards, bodies, ['image:{}'.format(image_id)])
+
+
+class AuthorArticle(models.Model):
+    """One row per (person page, live article) for person page bibliographies.
+
+    The article's date is copied here so a person's articles are read newest
+    first straight off the (person_page, date, id) index, a page at a time
+    with core.pagination. Rows are synced from the article's authors whenever
+    its ArticleCard is built and vanish with the card.
+    """
+
+    person_page = models.ForeignKey(
+        'people.PersonPage',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    card = models.ForeignKey(
+        'ArticleCard',
+        on_delete=models.CASCADE,
+        related_name='author_articles',
+    )
+    date = models.DateField()
+
+    class Meta:
+        unique_together = [('person_page', 'card')]
+        indexes = [
+            models.Index(fields=['person_page', 'date', 'id'], name='core_authorarticle_person_date'),
+        ]
+
+    @classmethod
+    def sync(cls, card):
+        """Match the rows for ``card`` to its article's current authors.
+
+        Returns the ids of the person pages that no longer list it.
+        """
+        person_pages = set(
+            Author.objects.filter(page_id=card.pk, author__person_page__isnull=False)
+            .values_list('author__person_page_id', flat=True)
+        )
+        rows = cls.objects.filter(card=card)
+        stale = rows.exclude(person_page_id__in=person_pages)
+        removed = set(stale.values_list('person_page_id', flat=True))
+        stale.delete()
+        # Rows are updated rather than recreated so their ids, which
+        # pagination cursors include, stay put
+        rows.exclude(date=card.date).update(date=card.date)
+        existing = set(rows.values_list('person_page_id', flat=True))
+        cls.objects.bulk_create([
+            cls(person_page_id=pk, card=card, date=card.date)
+            for pk in person_pages - existing
+        ])
+        cache.delete_many([bibliography_count_key(pk) for pk in person_pages | removed])
+        return removed
+
+
+def bibliography_count_key(person_page_id):
+    return 'person_page:{}:article_count'.format(person_page_id)
+
+
+class ArticleSlug(models.Model):
+    """Where a live article is served under its index page's date routes.
+
+    ``post_by_date_slug`` finds the article for ``<yyyy>/<mm>/<dd>/<slug>/``
+    with one lookup on the unique (index_page, date, slug) index; see
+    core.dated_slugs. Rows are synced when the card is built or the page
+    moves, and go with the card.
+    """
+
+    card = models.OneToOneField(
+        'ArticleCard',
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='dated_slug',
+    )
+    index_page = models.ForeignKey(
+        'wagtailcore.Page',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    date = models.DateField()
+    slug = models.SlugField(max_length=255, allow_unicode=True)
+
+    class Meta:
+        unique_together = [('index_page', 'date', 'slug')]
+
+    def __str__(self):
+        return '{}/{}'.format(self.date.isoformat(), self.slug)
+
+    @classmethod
+    def sync(cls, card, page):
+        """Point ``card``'s row at ``page``'s current parent, date and slug."""
+        index_page_id = page.get_parent().pk
+        row = cls.objects.filter(card=card).first()
+        if row and (row.index_page_id, row.date, row.slug) == (index_page_id, card.date, page.slug):
+            return
+        cls.objects.update_or_create(card=card, defaults={
+            'index_page_id': index_page_id,
+            'date': card.date,
+            'slug': page.slug,
+        })
+        dated_slugs.bump_version()
+
+
+ARCHIVE_MONTHS_KEY = 'archive:months'
+
+
+class ArchiveDay(models.Model):
+    """How many live articles were published on one date, for the date archive.
+
+    Kept in step with ArticleCard, so the archive navigation sums ``count``
+    per month, and the ArticleIndexPage date routes count their articles,
+    without scanning the articles. The routes list the articles themselves
+    with a range query on the ArticleCard date index.
+    """
+
+    date = models.DateField(primary_key=True)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    day = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year', 'month'], name='core_archiveday_year_month'),
+        ]
+
+    def __str__(self):
+        return '{} ({})'.format(self.date.isoformat(), self.count)
+
+    @classmethod
+    def refresh(cls, *days):
+        """Recount the articles for each of ``days`` (None is skipped)."""
+        for day in {day for day in days if day is not None}:
+            count = ArticleCard.objects.filter(date=day).count()
+            if count:
+                cls.objects.update_or_create(date=day, defaults={
+                    'year': day.year,
+                    'month': day.month,
+                    'day': day.day,
+                    'count': count,
+                })
+            else:
+                cls.objects.filter(date=day).delete()
+        cache.delete(ARCHIVE_MONTHS_KEY)
+
+    @classmethod
+    def count_between(cls, start, end):
+        """The number of articles dated from ``start`` up to ``end``."""
+        return cls.objects.filter(date__gte=start, date__lt=end).aggregate(
+            total=Sum('count'))['total'] or 0
+
+    @classmethod
+    def months(cls):
+        """[{'date', 'count'}] for every month with articles, newest first."""
+        months = cache.get(ARCHIVE_MONTHS_KEY)
+        if months is None:
+            rows = (
+                cls.objects.values('year', 'month')
+                .annotate(total=Sum('count'))
+                .order_by('-year', '-month')
+            )
+            months = [
+                {'date': date(row['year'], row['month'], 1), 'count': row['total']}
+                for row in rows
+            ]
+            cache.set(ARCHIVE_MONTHS_KEY, months, None)
+        return months
+
+
+def archive_range(year, month=None, day=None):
+    """[start, end) dates covering a year, month or day; ValueError if invalid."""
+    if day:
+        start = date(year, month, day)
+        return start, start + timedelta(days=1)
+    if month:
+        start = date(year, month, 1)
+        return start, date(year + month // 12, month % 12 + 1, 1)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+class RenderedBody(models.Model):
+    """ArticlePage body HTML rendered at publish time.
+
+    Bodies only change when an editor publishes, so the block templates are
+    rendered once per published revision rather than on every cache miss.
+    Run ``render_article_bodies`` after changing the stream templates.
+    """
+
+    page = models.OneToOneField(
+        'ArticlePage',
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='rendered_body',
+    )
+    revision = models.ForeignKey(
+        'wagtailcore.PageRevision',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    html = models.TextField(blank=True)
+    rendered_at = models.DateTimeField(auto_now=True)
+    # What the HTML embeds, so it is rendered again when they change
+    images = models.ManyToManyField('CustomImage', blank=True, related_name='+')
+    linked_pages = models.ManyToManyField('wagtailcore.Page', blank=True, related_name='+')
+
+    @classmethod
+    def render(cls, page, revision=None):
+        """Store ``page``'s body HTML; None if a block fails to render."""
+        try:
+            html = page.render_body()
+        except Exception:
+            # Don't abort the publish; without a stored body the page renders
+            # its blocks on each request, as previews do
+            logger.exception("Could not render the body of page %d", page.pk)
+            cls.objects.filter(page=page).delete()
+            return None
+        rendered, _ = cls.objects.update_or_create(
+            page=page,
+            defaults={
+                'revision': revision or page.get_latest_revision(),
+                'html': html,
+            },
+        )
+        image_ids, page_ids = stream_references(page.body)
+        rendered.images.set(CustomImage.objects.filter(pk__in=image_ids).values_list('pk', flat=True))
+        rendered.linked_pages.set(Page.objects.filter(pk__in=page_ids).values_list('pk', flat=True))
+        return rendered
+
+
+@receiver(page_published, sender=ArticlePage)
+def render_article_body(sender, instance, revision=None, **kwargs):
+    RenderedBody.render(instance, revision)
+
+
+@receiver(page_unpublished, sender=ArticlePage)
+def remove_rendered_body(sender, instance, **kwargs):
+    RenderedBody.objects.filter(page=instance).delete()
+
+
+@receiver(page_published, sender=ArticlePage)
+def rebuild_article_card(sender, instance, **kwargs):
+    ArticleCard.build(instance)
+
+
+@receiver(page_unpublished, sender=ArticlePage)
+def remove_article_card(sender, instance, **kwargs):
+    # Takes the article's AuthorArticle rows with it
+    person_pages = AuthorArticle.objects.filter(card_id=instance.pk).values_list('person_page_id', flat=True)
+    cache.delete_many([bibliography_count_key(pk) for pk in person_pages])
+    ArticleCard.objects.filter(page=instance).delete()
+
+
+@receiver(post_save, sender=CustomImage)
+@receiver(pre_delete, sender=CustomImage)
+def rebuild_for_image(sender, instance, **kwargs):
+    # A new file or focal point means new rendition URLs; a deleted image
+    # leaves its cards and bodies without one
+    rebuild_image_users(instance.pk)
+
+
+@receiver(post_delete, sender=CustomRendition)
+def rebuild_for_rendition(sender, instance, **kwargs):
+    # Replacing an image's file deletes the renditions cards and bodies
+    # point at. gc_media pauses regeneration and leaves those alone.
+    if not is_regeneration_paused():
+        rebuild_image_users(instance.image_id)
+
+
+@receiver(post_delete, sender=ArticleCard)
+def remove_archived_article(sender, instance, **kwargs):
+    # Unpublishing or deleting an article deletes its card
+    ArchiveDay.refresh(instance.date)
+    # ...and its ArticleSlug, which may be remembered by a worker
+    dated_slugs.bump_version()
+
+
+@receiver(post_save)
+def move_article_slug(sender, instance, created, update_fields=None, **kwargs):
+    # Page.move() re-saves the page under its new parent
+    if created or not isinstance(instance, Page):
+        return
+    if update_fields is not None and 'url_path' not in update_fields:
+        return
+    card = ArticleCard.objects.filter(pk=instance.pk).first()
+    if card is not None:
+        ArticleSlug.sync(card, instance)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def page_link_changed(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        clear_page_links(instance)
+
+
+@receiver(post_save)
+def page_link_moved(sender, instance, created, update_fields=None, **kwargs):
+    # Page.move() re-saves the page with its new url_path
+    if created or not isinstance(instance, Page):
+        return
+    if update_fields is None or 'url_path' in update_fields:
+        clear_page_links(instance)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_delete)
+def purge_cached_page(sender, instance, **kwargs):
+    if not isinstance(instance, Page):
+        return
+    tags = [page_tag(instance.pk)]
+    if isinstance(instance, BasePage):
+        # Listings show every article; author pages show their own
+        tags.append('article_list')
+        person_pages = Author.objects.filter(
+            page_id=instance.pk, author__person_page__isnull=False,
+        ).values_list('author__person_page_id', flat=True)
+        tags.extend(page_tag(pk) for pk in person_pages)
+    purge(*tags)
+
+
+@receiver(pre_save)
+def remember_url_path(sender, instance, update_fields=None, **kwargs):
+    # Page.move() and slug changes save the page with a new url_path; keep
+    # the stored one so the receivers below can tell
+    if not isinstance(instance, Page) or instance.pk is None:
+        return
+    if update_fields is None or 'url_path' in update_fields:
+        instance._saved_url_path = Page.objects.filter(pk=instance.pk).values_list(
+            'url_path', flat=True).first()
+
+
+def url_path_changed(instance):
+    saved = getattr(instance, '_saved_url_path', None)
+    return saved is not None and saved != instance.url_path
+
+
+@receiver(post_save)
+def purge_moved_pages(sender, instance, created, update_fields=None, **kwargs):
+    if created or not isinstance(instance, Page):
+        return
+    if update_fields is not None and 'url_path' not in update_fields:
+        return
+    if not url_path_changed(instance):
+        return
+    # Everything below a moved page is now served from a new URL. Wagtail
+    # rewrites the descendants' url_paths after this signal, so their new
+    # ones are worked out from the moved page's.
+    old_prefix = instance._saved_url_path
+    tags = []
+    moved = []
+    cards = set(ArticleCard.objects.filter(
+        page__path__startswith=instance.path).values_list('pk', flat=True))
+    for page in Page.objects.filter(path__startswith=instance.path):
+        moved.append(page.pk)
+        tags.append(page_tag(page.pk))
+        if page.pk in cards:
+            if page.url_path.startswith(old_prefix):
+                page.url_path = instance.url_path + page.url_path[len(old_prefix):]
+            ArticleCard.objects.filter(pk=page.pk).update(url=page.url or '')
+    if cards:
+        tags.append('article_list')
+    purge(*tags)
+    # Bodies linking into the subtree; rendered after commit, once Wagtail
+    # has rewritten the descendants' url_paths
+    bodies = RenderedBody.objects.filter(linked_pages__in=moved).values_list('page_id', flat=True)
+    rebuild_stored(bodies=set(bodies))
+
+
+class ArticleIndexPage(RoutablePageMixin, Page):
     subpage_types = [
         'core.ArticlePage',
     ]
@@ -215,19 +909,27 @@ class ArticleIndexPage(Page):
     @route(r'^(\d{4})/(\d{2})/$')
     @route(r'^(\d{4})/(\d{2})/(\d{2})/$')
     def post_by_date(self, request, year, month=None, day=None, *args, **kwargs):
-        self.posts = self.get_posts().filter(date__year=year)
+        try:
+            self.archive_range = archive_range(int(year), int(month or 0), int(day or 0))
+        except ValueError:
+            raise Http404
+        self.search_type = 'date'
+        self.search_term = year
         if month:
-            self.posts = self.posts.filter(date__month=month)
             df = DateFormat(date(int(year), int(month), 1))
             self.search_term = df.format('F Y')
         if day:
-            self.posts = self.posts.filter(date__day=day)
             self.search_term = date_format(date(int(year), int(month), int(day)))
         return Page.serve(self, request, *args, **kwargs)
 
     @route(r'^(\d{4})/(\d{2})/(\d{2})/(.+)/$')
     def post_by_date_slug(self, request, year, month, day, slug, *args, **kwargs):
-        post_page = self.get_posts().filter(slug=slug).first()
+        try:
+            post_date = date(int(year), int(month), int(day))
+        except ValueError:
+            raise Http404
+        page_id = dated_slugs.resolve(self.pk, post_date, slug)
+        post_page = ArticlePage.objects.filter(pk=page_id).first() if page_id else None
         if not post_page:
             raise Http404
         return Page.serve(post_page, request, *args, **kwargs)
@@ -248,25 +950,27 @@ class ArticleIndexPage(Page):
     def get_context(self, request, *args, **kwargs):
         """Adding custom stuff to our context."""
         context = super().get_context(request, *args, **kwargs)
-        # Get all posts
-        all_posts = ArticlePage.objects.filter(article_categories__article_category__slug=self.slug)
-        # Paginate all posts by 2 per page
-        paginator = Paginator(all_posts, 2)
-        # Try to get the ?page=x value
-        page = request.GET.get("page")
-        try:
-            # If the page exists and the ?page=x is an int
-            posts = paginator.page(page)
-        except PageNotAnInteger:
-            # If the ?page=x is not an int; show the first page
-            posts = paginator.page(1)
-        except EmptyPage:
-            # If the ?page=x is out of range (too high most likely)
-            # Then return the last page
-            posts = paginator.page(paginator.num_pages)
-
-        # "posts" will have child pages; you'll need to use .specific in the template
-        # in order to access child properties, such as youtube_video_id and subtitle
+        depends_on(page_tag(self.pk), 'category:{}'.format(self.slug), 'article_list')
+        if getattr(self, 'archive_range', None):
+            # A date route: a range on the card date index, counted from the archive
+            start, end = self.archive_range
+            posts = paginate_by_date(
+                request, ArticleCard.objects.filter(date__gte=start, date__lt=end), 2,
+                count=ArchiveDay.count_between(start, end),
+            )
+        else:
+            # Get all posts
+            all_posts = ArticleCard.objects.filter(
+                page__article_categories__article_category__slug=self.slug)
+            # Paginate all posts by 2 per page, keyed on (date, id)
+            posts = paginate_by_date(
+                request, all_posts, 2,
+                count_cache_key='article_index:{}:article_count'.format(self.pk),
+            )
+
+        depends_on(*card_image_tags(posts))
+
+        # "posts" are ArticleCard rows; see includes/article_card.html
         context["posts"] = posts
         return context
 
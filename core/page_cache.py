@@ -0,0 +1,303 @@
+"""Dependency tracking for the wagtailcache page cache.
+
+While a page renders, the code that loads pages, menus, categories, people,
+images and settings calls ``depends_on()`` with a tag for each object it
+used (``page:12``, ``menu:side-navigation``, ...). The tags are stored next
+to the response, with the time its render started. Saving or publishing one
+of those objects calls ``purge()`` with its tags, which only stamps each tag
+with the current time. A cached response is served while every one of its
+tags was last purged before it was rendered. Otherwise it is deleted on the
+spot and treated as a miss. No shared list of responses per tag is kept, so
+concurrent renders and purges never have to read and rewrite one.
+
+The middleware also protects against cache stampedes. Each stored response
+keeps a stale copy for ``PAGE_CACHE_GRACE`` seconds past its timeout. When an
+entry expires (or is purged), one worker takes a short cross-process lock and
+re-renders it while the others keep serving the stale copy.
+
+The middleware classes here replace the wagtailcache ones in MIDDLEWARE.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_cache_key, patch_vary_headers
+
+from wagtailcache import cache as wagtailcache
+
+TAG_KEY = 'page_cache:tag:{}'
+ENTRY_KEY = 'page_cache:entry:{}'
+STALE_KEY = 'page_cache:stale:{}'
+LOCK_KEY = 'page_cache:lock:{}'
+STATS_KEY = 'page_cache:stats:{}'
+
+# Seconds a stale copy may be served after its entry expires
+GRACE = getattr(settings, 'PAGE_CACHE_GRACE', 300)
+# Seconds before a regeneration lock is considered abandoned
+LOCK_TIMEOUT = getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30)
+# Seconds to wait for another worker when there is no stale copy to serve
+LOCK_WAIT = getattr(settings, 'PAGE_CACHE_LOCK_WAIT', 2)
+# Counters are kept per process and added to the shared totals in batches
+STATS_FLUSH_EVERY = 100
+# As in django.middleware.gzip
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+# Every page renders the site settings (social links, logo)
+ALWAYS_DEPENDS_ON = ('settings',)
+
+_local = threading.local()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_page_cache():
+    return caches[getattr(settings, 'WAGTAIL_CACHE_BACKEND', 'default')]
+
+
+def depends_on(*tags):
+    """Record that the response being rendered was built from ``tags``."""
+    deps = getattr(_local, 'deps', None)
+    if deps is not None:
+        deps.update(tags)
+
+
+def page_tag(page_id):
+    return 'page:{}'.format(page_id)
+
+
+def tag_times(page_cache, tags):
+    """{tag: time (ns) the tag was last purged} for ``tags``."""
+    keys = {tag: TAG_KEY.format(tag) for tag in tags}
+    found = page_cache.get_many(list(keys.values()))
+    times = {}
+    for tag, key in keys.items():
+        if key not in found:
+            # Evicted since a response using it was recorded: count it as
+            # purged now, so nothing rendered before a purge we have
+            # forgotten is served
+            page_cache.add(key, time.time_ns(), None)
+            found[key] = page_cache.get(key, 0)
+        times[tag] = found[key]
+    return times
+
+
+def record(cache_key, tags, rendered_at):
+    """Store the tags of the response at ``cache_key`` and when its render started."""
+    page_cache = get_page_cache()
+    # Tags nothing has used yet start out purged just before this render,
+    # so the response is current straight away
+    for tag in tags:
+        page_cache.add(TAG_KEY.format(tag), rendered_at - 1, None)
+    page_cache.set(
+        ENTRY_KEY.format(cache_key), (rendered_at, sorted(tags)),
+        page_cache.default_timeout + GRACE,
+    )
+
+
+def is_current(page_cache, cache_key):
+    """False when a tag of the response at ``cache_key`` was purged since it was rendered."""
+    deps = page_cache.get(ENTRY_KEY.format(cache_key))
+    if deps is None:
+        return False
+    rendered_at, tags = deps
+    return all(purged < rendered_at for purged in tag_times(page_cache, tags).values())
+
+
+def forget(page_cache, cache_key):
+    page_cache.delete_many([cache_key, ENTRY_KEY.format(cache_key)])
+
+
+def purge(*tags):
+    """Stop serving every cached response that depends on any of ``tags``.
+
+    Inside a transaction this happens on commit, so a render that reads the
+    old rows before then is not taken as up to date.
+    """
+    def stamp():
+        now = time.time_ns()
+        get_page_cache().set_many({TAG_KEY.format(tag): now for tag in tags}, None)
+
+    transaction.on_commit(stamp)
+
+
+def count(name):
+    with _stats_lock:
+        _stats[name] += 1
+        if sum(_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_stats)
+        _stats.clear()
+    page_cache = get_page_cache()
+    for name, value in pending.items():
+        key = STATS_KEY.format(name)
+        page_cache.add(key, 0, None)
+        try:
+            page_cache.incr(key, value)
+        except ValueError:
+            # Evicted between add() and incr()
+            page_cache.set(key, value, None)
+
+
+def get_stats():
+    """Hit, miss and stale totals across all workers (plus this one's backlog)."""
+    names = ('hit', 'miss', 'stale')
+    totals = get_page_cache().get_many([STATS_KEY.format(name) for name in names])
+    with _stats_lock:
+        return {
+            name: totals.get(STATS_KEY.format(name), 0) + _stats[name]
+            for name in names
+        }
+
+
+class RegenerationLock:
+    """Short lock so only one worker re-renders an expired page.
+
+    FileBasedCache.add() is not atomic across processes, so with that backend
+    the lock is an exclusively-created file next to the cache entries. Other
+    backends (e.g. local memory in tests) use cache.add().
+    """
+
+    def __init__(self, page_cache, cache_key):
+        self.page_cache = page_cache
+        self.key = LOCK_KEY.format(cache_key)
+        cache_dir = getattr(page_cache, '_dir', None)
+        self.path = None
+        if cache_dir:
+            name = hashlib.md5(self.key.encode()).hexdigest() + '.lock'
+            self.path = os.path.join(cache_dir, name)
+
+    def acquire(self):
+        if self.path is None:
+            return self.page_cache.add(self.key, 1, LOCK_TIMEOUT)
+        try:
+            os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        # Break a lock left behind by a worker that died mid-render
+        try:
+            if time.time() - os.path.getmtime(self.path) > LOCK_TIMEOUT:
+                os.remove(self.path)
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+        except OSError:
+            pass
+        return False
+
+    def release(self):
+        if self.path is None:
+            self.page_cache.delete(self.key)
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def use_precompressed(request, response):
+    """Send the gzipped body stored by ShardedFileCache when the client takes it.
+
+    The rewritten response is only fit for this client, so the request is
+    marked so that UpdateCacheMiddleware never stores it.
+    """
+    body = getattr(response, 'gzipped_content', None)
+    if not body or response.has_header('Content-Encoding'):
+        return response
+    if not re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        return response
+    request._cache_update_cache = False
+    response.content = body
+    response['Content-Encoding'] = 'gzip'
+    response['Content-Length'] = str(len(body))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class FetchFromCacheMiddleware(wagtailcache.FetchFromCacheMiddleware):
+    def process_request(self, request):
+        _local.deps = set(ALWAYS_DEPENDS_ON)
+        _local.started = time.time_ns()
+        response = super().process_request(request)
+        page_cache = get_page_cache()
+        if response is not None:
+            cache_key = get_cache_key(request, None, request.method, cache=page_cache)
+            if cache_key and is_current(page_cache, cache_key):
+                # Served from the cache; nothing new to record
+                _local.deps = None
+                count('hit')
+                return use_precompressed(request, response)
+            # Purged since it was stored; render it again below, and let
+            # UpdateCacheMiddleware store the new copy
+            if cache_key:
+                forget(page_cache, cache_key)
+            request._cache_update_cache = True
+
+        # wagtailcache leaves this False for requests it won't cache
+        if not getattr(request, '_cache_update_cache', False):
+            return None
+        cache_key = get_cache_key(request, None, request.method, cache=page_cache)
+        if cache_key is None:
+            # Never cached before, so there is nothing to coalesce on
+            count('miss')
+            return None
+
+        lock = RegenerationLock(page_cache, cache_key)
+        if lock.acquire():
+            request._page_cache_lock = lock
+            count('miss')
+            return None
+
+        # Another worker is already rendering this page. What is served
+        # here must not be stored again as if it had just been rendered.
+        stale = page_cache.get(STALE_KEY.format(cache_key))
+        if stale is not None:
+            _local.deps = None
+            request._cache_update_cache = False
+            stale['X-Wagtail-Cache'] = 'stale'
+            count('stale')
+            return use_precompressed(request, stale)
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = page_cache.get(cache_key)
+            if response is not None and is_current(page_cache, cache_key):
+                _local.deps = None
+                request._cache_update_cache = False
+                response['X-Wagtail-Cache'] = 'hit'
+                count('hit')
+                return use_precompressed(request, response)
+        count('miss')
+        return None
+
+
+class UpdateCacheMiddleware(wagtailcache.UpdateCacheMiddleware):
+    def process_response(self, request, response):
+        deps = getattr(_local, 'deps', None)
+        _local.deps = None
+        if response.has_header('Content-Encoding'):
+            # Already encoded (e.g. by use_precompressed); ShardedFileCache
+            # gzips what it stores, so this would be stored gzipped twice
+            request._cache_update_cache = False
+            deps = None
+        try:
+            response = super().process_response(request, response)
+            if deps and request.method in ('GET', 'HEAD') and response.status_code == 200:
+                page_cache = get_page_cache()
+                cache_key = get_cache_key(request, None, request.method, cache=page_cache)
+                if cache_key and page_cache.has_key(cache_key):
+                    record(cache_key, deps, _local.started)
+                    page_cache.set(
+                        STALE_KEY.format(cache_key), response,
+                        page_cache.default_timeout + GRACE,
+                    )
+        finally:
+            lock = getattr(request, '_page_cache_lock', None)
+            if lock is not None:
+                lock.release()
+        return response
@@ -0,0 +1,195 @@
+import base64
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import Http404
+
+# Pages reachable with ?page=N before switching to cursors
+NUMBERED_PAGES = 5
+
+
+class KeysetPage:
+    """One page of results from a KeysetPaginator.
+
+    Mirrors the parts of django.core.paginator.Page that our templates use, so
+    ``includes/paginator.html`` renders either kind of page.
+    """
+
+    def __init__(self, object_list, paginator, number=None,
+                 has_next=False, has_previous=False):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1 if self.number else None
+
+    def previous_page_number(self):
+        return self.number - 1 if self.number else None
+
+    @property
+    def next_querystring(self):
+        if not self._has_next:
+            return ''
+        if self.number and self.number < self.paginator.numbered_pages:
+            return 'page={}'.format(self.number + 1)
+        return 'after={}'.format(self.paginator.encode_cursor(self.object_list[-1]))
+
+    @property
+    def previous_querystring(self):
+        if not self._has_previous:
+            return ''
+        if self.number and self.number > 1:
+            return 'page={}'.format(self.number - 1)
+        return 'before={}'.format(self.paginator.encode_cursor(self.object_list[0]))
+
+
+class KeysetPaginator:
+    """Paginate a queryset newest first on ``(date, id)`` without OFFSET scans.
+
+    The first ``numbered_pages`` pages are addressed with ``?page=N`` like
+    Django's Paginator. Past that, pages are addressed with opaque
+    ``?after=``/``?before=`` cursors so page 400 costs the same indexed range
+    query as page 1. The total count is only used for the numbered links and
+    is cached under ``count_cache_key`` when one is given, or taken from
+    ``count`` when the caller already knows it.
+    """
+
+    def __init__(self, queryset, per_page, numbered_pages=NUMBERED_PAGES,
+                 count_cache_key=None, count_timeout=300, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.numbered_pages = numbered_pages
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+        self._count = count
+
+    @property
+    def count(self):
+        if self._count is not None:
+            return self._count
+        if self.count_cache_key is None:
+            return self.queryset.count()
+        count = cache.get(self.count_cache_key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(self.count_cache_key, count, self.count_timeout)
+        return count
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, self.numbered_pages) + 1)
+
+    def encode_cursor(self, obj):
+        raw = '{}.{}'.format(obj.date.isoformat(), obj.pk).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            day, pk = raw.split('.')
+            year, month, day = (int(part) for part in day.split('-'))
+            return date(year, month, day), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+
+    def page(self, number=None, after=None, before=None):
+        """Return the page for a ``?page=``, ``?after=`` or ``?before=`` value.
+
+        Bad or missing values fall back to the first page, matching the way
+        our views treated PageNotAnInteger. Numbers past ``numbered_pages``
+        raise Http404 rather than serving another page's content.
+        """
+        if after:
+            cursor = self.decode_cursor(after)
+            if cursor:
+                return self._page_after(cursor)
+        if before:
+            cursor = self.decode_cursor(before)
+            if cursor:
+                return self._page_before(cursor)
+        return self._numbered_page(number)
+
+    def _ordered(self):
+        return self.queryset.order_by('-date', '-pk')
+
+    def _numbered_page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        # Deep numbered pages are exactly what this paginator avoids; anything
+        # past the numbered range is reached by following cursors instead.
+        if number > self.numbered_pages:
+            raise Http404("Page {} is past the numbered pages.".format(number))
+        number = max(number, 1)
+        offset = (number - 1) * self.per_page
+        rows = list(self._ordered()[offset:offset + self.per_page + 1])
+        return KeysetPage(
+            rows[:self.per_page], self, number=number,
+            has_next=len(rows) > self.per_page,
+            has_previous=number > 1,
+        )
+
+    def _page_after(self, cursor):
+        day, pk = cursor
+        rows = list(
+            self._ordered()
+            .filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))[:self.per_page + 1]
+        )
+        return KeysetPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=True,
+        )
+
+    def _page_before(self, cursor):
+        day, pk = cursor
+        rows = list(
+            self.queryset.order_by('date', 'pk')
+            .filter(Q(date__gt=day) | Q(date=day, pk__gt=pk))[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(
+            rows, self,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+
+def paginate_by_date(request, queryset, per_page, count_cache_key=None, count=None):
+    """Build the keyset page for the current request's query string."""
+    paginator = KeysetPaginator(queryset, per_page, count_cache_key=count_cache_key, count=count)
+    return paginator.page(
+        number=request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
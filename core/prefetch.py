@@ -0,0 +1,205 @@
+"""Resolve the objects a StreamField body needs before it renders.
+
+Wagtail converts each chooser inside a StructBlock or ListBlock with its own
+query, ``{% image %}`` looks up every rendition separately, and every linked
+page works out its URL on its own. These helpers
+walk the raw stream data once, fetch everything in bulk, and return a
+StreamValue built from the fetched objects so block templates render without
+further queries.
+"""
+from django.core.cache import cache
+
+from wagtail.core.blocks import (ListBlock, PageChooserBlock, StreamBlock,
+                                 StreamValue, StructBlock)
+from wagtail.core.models import Page, Site
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageChooserBlock
+from wagtail.images.models import Filter
+
+from core.page_cache import depends_on
+from core.renditions import cache_rendition, get_cached_rendition, rendition_cache_key
+
+# Spec used by an image that no enclosing block declares ``filter_specs`` for;
+# ImageChooserBlock renders the original rendition by default.
+DEFAULT_FILTER_SPECS = ('original',)
+
+PAGE_LINK_CACHE_KEY = 'page_link:{}:{}'
+
+
+class PageLink:
+    """The parts of a linked Page that block templates use."""
+
+    def __init__(self, pk, title, url):
+        self.pk = self.id = pk
+        self.title = title
+        self.url = url
+
+    def __str__(self):
+        return self.title
+
+
+def _collect(block, raw, specs, images, pages):
+    if raw is None:
+        return
+    specs = getattr(block.meta, 'filter_specs', None) or specs
+    if isinstance(block, ImageChooserBlock):
+        images.setdefault(raw, set()).update(specs)
+    elif isinstance(block, PageChooserBlock):
+        pages.add(raw)
+    elif isinstance(block, StructBlock):
+        for name, child_block in block.child_blocks.items():
+            if name in raw:
+                _collect(child_block, raw[name], specs, images, pages)
+    elif isinstance(block, ListBlock):
+        for item in raw:
+            _collect(block.child_block, item, specs, images, pages)
+    elif isinstance(block, StreamBlock):
+        for item in raw:
+            child_block = block.child_blocks.get(item['type'])
+            if child_block is not None:
+                _collect(child_block, item['value'], specs, images, pages)
+
+
+def _to_python(block, raw, images, pages):
+    """Like block.to_python, but takes images and pages from the prefetched dicts."""
+    if isinstance(block, ImageChooserBlock):
+        return images.get(raw) if raw is not None else None
+    if isinstance(block, PageChooserBlock):
+        return pages.get(raw) if raw is not None else None
+    if isinstance(block, StructBlock) and raw is not None:
+        return block.meta.value_class(block, [
+            (name, _to_python(child_block, raw[name], images, pages)
+             if name in raw else child_block.get_default())
+            for name, child_block in block.child_blocks.items()
+        ])
+    if isinstance(block, ListBlock) and raw is not None:
+        return [_to_python(block.child_block, item, images, pages) for item in raw]
+    return block.to_python(raw)
+
+
+def fetch_images(found):
+    """Fetch images and their renditions in at most two queries.
+
+    ``found`` maps image id to the filter specs needed for it. The returned
+    images carry their renditions so CustomImage.get_rendition skips the DB.
+    Renditions in the shared rendition cache need no query at all.
+    """
+    depends_on(*('image:{}'.format(pk) for pk in found))
+    Image = get_image_model()
+    images = Image.objects.in_bulk(list(found))
+    if not images:
+        return images
+    wanted = {}
+    for image in images.values():
+        image.prefetched_renditions = {}
+        for spec in found[image.pk]:
+            focal_point_key = Filter(spec=spec).get_cache_key(image)
+            wanted[rendition_cache_key(image, spec, focal_point_key)] = (image, spec, focal_point_key)
+
+    missing = set()
+    cached = cache.get_many(list(wanted))
+    for key, (image, spec, focal_point_key) in wanted.items():
+        if key in cached:
+            image.prefetched_renditions[(spec, focal_point_key)] = get_cached_rendition(
+                image, spec, focal_point_key, cached[key])
+        else:
+            missing.add(image.pk)
+    if not missing:
+        return images
+
+    specs = set().union(*(found[pk] for pk in missing))
+    renditions = Image.get_rendition_model().objects.filter(
+        image_id__in=list(missing),
+        filter_spec__in=specs,
+    )
+    for rendition in renditions:
+        image = images[rendition.image_id]
+        rendition.image = image
+        image.prefetched_renditions[(rendition.filter_spec, rendition.focal_point_key)] = rendition
+        cache_rendition(rendition)
+    return images
+
+
+def fetch_page_links(ids, request=None):
+    """Resolve page ids to PageLinks, using the per-site URL cache.
+
+    Pages missing from the cache are loaded in one query. Deleted pages are
+    cached as misses too, so they resolve to None without a query.
+    """
+    site = getattr(request, 'site', None)
+    site_id = site.id if site else 0
+    keys = {PAGE_LINK_CACHE_KEY.format(site_id, pk): pk for pk in ids}
+    cached = cache.get_many(list(keys))
+    links = {keys[key]: value for key, value in cached.items()}
+
+    missing = [pk for pk in ids if pk not in links]
+    if missing:
+        fetched = {}
+        for page in Page.objects.filter(id__in=missing).only('id', 'title', 'url_path'):
+            fetched[page.id] = (page.title, page.get_url(request))
+        for pk in missing:
+            links[pk] = fetched.get(pk, ())
+        cache.set_many({
+            PAGE_LINK_CACHE_KEY.format(site_id, pk): links[pk] for pk in missing
+        }, None)
+
+    return {
+        pk: PageLink(pk, *value)
+        for pk, value in links.items()
+        if value
+    }
+
+
+def clear_page_links(page):
+    """Forget cached URLs for ``page`` and everything below it."""
+    ids = {page.pk}
+    ids.update(Page.objects.filter(path__startswith=page.path).values_list('id', flat=True))
+    site_ids = [0] + list(Site.objects.values_list('id', flat=True))
+    cache.delete_many([
+        PAGE_LINK_CACHE_KEY.format(site_id, pk)
+        for site_id in site_ids
+        for pk in ids
+    ])
+
+
+def stream_references(stream_value):
+    """The ids of the images and pages that ``stream_value``'s blocks refer to."""
+    stream_block = stream_value.stream_block
+    if getattr(stream_value, 'is_lazy', False):
+        raw = stream_value.stream_data
+    else:
+        # Converted values (e.g. straight from the edit form) go back to raw data
+        raw = stream_block.get_prep_value(stream_value)
+    found_images = {}
+    found_pages = set()
+    for item in raw:
+        child_block = stream_block.child_blocks.get(item['type'])
+        if child_block is not None:
+            _collect(child_block, item['value'], DEFAULT_FILTER_SPECS, found_images, found_pages)
+    return set(found_images), found_pages
+
+
+def prefetch_stream(stream_value, request=None):
+    """Return a copy of ``stream_value`` with its images and links resolved in bulk."""
+    if not getattr(stream_value, 'is_lazy', False):
+        # Already converted (e.g. a preview built from a form), nothing to batch
+        return stream_value
+
+    stream_block = stream_value.stream_block
+    items = [
+        (stream_block.child_blocks[item['type']], item)
+        for item in stream_value.stream_data
+        if item['type'] in stream_block.child_blocks
+    ]
+
+    found_images = {}
+    found_pages = set()
+    for child_block, item in items:
+        _collect(child_block, item['value'], DEFAULT_FILTER_SPECS, found_images, found_pages)
+    images = fetch_images(found_images)
+    pages = fetch_page_links(found_pages, request)
+
+    return StreamValue(stream_block, [
+        (item['type'], _to_python(child_block, item['value'], images, pages), item.get('id'))
+        for child_block, item in items
+    ])
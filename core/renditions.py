@@ -0,0 +1,197 @@
+"""Generate image renditions ahead of time.
+
+Wagtail creates a rendition the first time a template asks for it, so the
+reader who happens to make that request waits for Pillow to resize the
+original. Our templates and blocks only use the specs in ``RENDITION_SPECS``.
+Those are generated in a separate process pool as soon as an image is
+uploaded or changed, and ``./manage.py generate_renditions`` backfills the
+existing library.
+
+``{% responsive_image %}`` serves a ladder of ``width-N`` renditions
+(``RESPONSIVE_SPECS``), each with a WebP copy made at the same time.
+
+Existing renditions are looked up in the shared cache before the database,
+so every worker benefits from a lookup any of them has made. The key
+includes the image's file name and the rendition's focal point key, so
+uploading a new file or moving the focal point moves on to new keys.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+
+from core.ingest import placeholder_data_uri
+
+logger = logging.getLogger(__name__)
+
+# Widths offered in responsive_image srcsets; renditions never upscale
+RESPONSIVE_WIDTHS = getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', (320, 480, 750, 1000, 1500))
+RESPONSIVE_SPECS = tuple('width-{}'.format(width) for width in RESPONSIVE_WIDTHS)
+
+# Every spec a template or block asks for, plus the admin's listing thumbnail
+RENDITION_SPECS = getattr(settings, 'RENDITION_SPECS', (
+    'fill-300x200',   # article cards, person cards, CardBlock
+    'fill-340x240',   # article index listing
+    'max-165x165',    # Wagtail admin image listing
+    'max-800x600',    # Wagtail admin image edit view
+    'original',       # ImageChooserBlock
+    'height-400',     # ImageCarouselBlock
+) + RESPONSIVE_SPECS)  # article header
+RENDITION_WORKERS = getattr(settings, 'RENDITION_WORKERS', 2)
+
+RENDITION_CACHE_KEY = 'rendition:{image}:{file}:{spec}:{focal}'
+RENDITION_CACHE_TIMEOUT = getattr(settings, 'RENDITION_CACHE_TIMEOUT', 60 * 60 * 24 * 30)
+
+_pool = None
+_pending = set()
+_lock = threading.Lock()
+_paused = threading.local()
+
+
+def _setup_worker():
+    # Pool processes are spawned rather than forked so they never share the
+    # parent's database connections; each sets Django up for itself.
+    import django
+    django.setup()
+
+
+def get_pool(workers=RENDITION_WORKERS):
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = make_pool(workers)
+        return _pool
+
+
+def make_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_setup_worker,
+    )
+
+
+def generate_renditions(image_id, specs=RENDITION_SPECS):
+    """Make sure ``image_id`` has a rendition for each spec.
+
+    Runs in a pool process. Returns the number of specs that could not be
+    rendered, e.g. because the original file is missing.
+    """
+    from wagtail.images import get_image_model
+    from wagtail.images.models import SourceImageIOError
+
+    Image = get_image_model()
+    try:
+        image = Image.objects.get(pk=image_id)
+    except Image.DoesNotExist:
+        return 0
+    failed = 0
+    if not image.placeholder:
+        # Images uploaded before placeholders existed; update() avoids the
+        # post_save handler, which would queue this image again
+        try:
+            Image.objects.filter(pk=image_id).update(
+                placeholder=placeholder_data_uri(image.file))
+        except (IOError, OSError):
+            logger.exception("Could not make a placeholder for image %d", image_id)
+    for spec in specs:
+        try:
+            rendition = image.get_rendition(spec)
+            if spec in RESPONSIVE_SPECS and not rendition.webp:
+                rendition.make_webp()
+        except (SourceImageIOError, IOError):
+            logger.exception("Could not render %s for image %d", spec, image_id)
+            failed += 1
+    return failed
+
+
+def rendition_cache_key(image, spec, focal_point_key):
+    return RENDITION_CACHE_KEY.format(
+        image=image.pk,
+        file=hashlib.md5(image.file.name.encode()).hexdigest()[:12],
+        spec=spec,
+        focal=focal_point_key or '-',
+    )
+
+
+def get_cached_rendition(image, spec, focal_point_key, cached=None):
+    """Rebuild a rendition from the shared cache, without a query, or None.
+
+    Pass ``cached`` when the entry has already been read with get_many.
+    """
+    if cached is None:
+        cached = cache.get(rendition_cache_key(image, spec, focal_point_key))
+    if cached is None:
+        return None
+    pk, file_name, width, height, webp_name = cached
+    return image.get_rendition_model()(
+        pk=pk, image=image, filter_spec=spec, focal_point_key=focal_point_key,
+        file=file_name, width=width, height=height, webp=webp_name,
+    )
+
+
+def cache_rendition(rendition):
+    key = rendition_cache_key(rendition.image, rendition.filter_spec, rendition.focal_point_key)
+    cache.set(key, (
+        rendition.pk, rendition.file.name, rendition.width, rendition.height,
+        rendition.webp.name or '',
+    ), RENDITION_CACHE_TIMEOUT)
+
+
+def forget_rendition(rendition):
+    try:
+        image = rendition.image
+    except ObjectDoesNotExist:
+        # Deleted along with its image, whose keys can no longer be reached
+        return
+    cache.delete(rendition_cache_key(image, rendition.filter_spec, rendition.focal_point_key))
+
+
+@contextmanager
+def regeneration_paused():
+    """Delete renditions on purpose without queueing them to be made again."""
+    _paused.active = True
+    try:
+        yield
+    finally:
+        _paused.active = False
+
+
+def is_regeneration_paused():
+    return getattr(_paused, 'active', False)
+
+
+def queue_renditions(image_id):
+    """Generate ``image_id``'s renditions in the background after commit."""
+    if is_regeneration_paused():
+        return
+
+    def submit():
+        with _lock:
+            if image_id in _pending:
+                return
+            _pending.add(image_id)
+        try:
+            future = get_pool().submit(generate_renditions, image_id)
+        except RuntimeError:
+            # The pool is shutting down with the process
+            _finished(image_id)
+            return
+        future.add_done_callback(lambda future: _finished(image_id, future))
+
+    transaction.on_commit(submit)
+
+
+def _finished(image_id, future=None):
+    with _lock:
+        _pending.discard(image_id)
+    if future is not None and future.exception() is not None:
+        logger.error("Rendition generation failed for image %d", image_id,
+                     exc_info=future.exception())
@@ -1,7 +1,7 @@
 from django.template import Library, loader
 from django.urls import resolve
-from core.models import ArticleIndexPage, ArticlePage
-from people.models import RoleAssignment, YearsActive, StaffPage
+from core.models import ArchiveDay, ArticleIndexPage, ArticlePage
+from people.models import StaffPage
 from home.models import HomePage
 
 register = Library()
@@ -39,11 +39,6 @@ def post_cat_url(cat, blog_page):
     return url
 
 
-@register.simple_tag()
-def get_role(person, year):
-    role = RoleAssignment.objects.filter(page=person, year=YearsActive.objects.get(year_string=year))
-    return role
-
 @register.simple_tag()
 def get_posts_by_category(category):
     posts = ArticlePage.objects.filter(article_categories__article_category__slug=category)
@@ -52,4 +47,15 @@ def get_posts_by_category(category):
 @register.simple_tag()
 def tagline():
     home = HomePage.objects.get(slug='home')
-    return home.tagline
\ No newline at end of file
+    return home.tagline
+
+@register.inclusion_tag('includes/archive_nav.html')
+def archive_nav(index_page):
+    """Months with articles and their counts, linking to ``index_page``'s date routes."""
+    months = [
+        dict(month, url=index_page.url + index_page.reverse_subpage(
+            'post_by_date', args=(month['date'].year, '{0:02}'.format(month['date'].month)),
+        ))
+        for month in ArchiveDay.months()
+    ]
+    return {'months': months}
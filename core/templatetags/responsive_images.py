@@ -0,0 +1,92 @@
+from urllib.parse import quote
+
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from core.renditions import RESPONSIVE_SPECS, RESPONSIVE_WIDTHS
+
+register = template.Library()
+
+PLACEHOLDER_STYLE = 'background: #e0e0e0 url({}) center / cover no-repeat'
+BLANK_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" '
+    'viewBox="0 0 {0} {1}"><rect width="100%" height="100%" fill="#e0e0e0"/></svg>'
+)
+
+
+@register.simple_tag
+def placeholder_style(placeholder):
+    """A style="" attribute painting an image's inline placeholder.
+
+    Takes an image or an already stored placeholder data URI (e.g.
+    ArticleCard.image_placeholder). The blurred preview shows behind the
+    <img> until the real file has loaded.
+    """
+    placeholder = getattr(placeholder, 'placeholder', placeholder)
+    if not placeholder:
+        return ''
+    return format_html('style="{}"', PLACEHOLDER_STYLE.format(placeholder))
+
+
+@register.simple_tag
+def blank_image_url(width, height):
+    """A grey box of the given size as a data: URI, for items with no image."""
+    return 'data:image/svg+xml,' + quote(BLANK_SVG.format(width, height))
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', max_width=None, alt=None, **attrs):
+    """Render ``image`` as a <picture> with WebP and JPEG/PNG srcsets.
+
+    Browsers pick a size from the ``width-N`` ladder in
+    core.renditions.RESPONSIVE_WIDTHS using ``sizes``. ``max_width`` is the
+    widest the image is ever displayed (in CSS pixels); widths beyond twice
+    that are left out, and the fallback ``src`` is the largest one within it.
+    Any other keyword arguments become attributes of the <img>, e.g.
+    ``{% responsive_image page.main_image max_width=750 class="img-fluid" %}``.
+    """
+    if not image:
+        return ''
+    specs = [
+        spec for width, spec in zip(RESPONSIVE_WIDTHS, RESPONSIVE_SPECS)
+        if max_width is None or width <= 2 * int(max_width)
+    ] or list(RESPONSIVE_SPECS[:1])
+
+    # Width operations don't depend on the focal point, so one query finds them
+    found = {
+        rendition.filter_spec: rendition
+        for rendition in image.renditions.filter(filter_spec__in=specs, focal_point_key='')
+    }
+    renditions = []
+    for spec in specs:
+        rendition = found.get(spec) or image.get_rendition(spec)
+        # Small originals give the same rendition for several widths
+        if not renditions or rendition.width > renditions[-1].width:
+            renditions.append(rendition)
+
+    fallback = renditions[0]
+    for rendition in renditions:
+        if max_width is None or rendition.width <= int(max_width):
+            fallback = rendition
+
+    img_attrs = {
+        'src': fallback.url,
+        'srcset': ', '.join('{} {}w'.format(r.url, r.width) for r in renditions),
+        'sizes': sizes,
+        'width': fallback.width,
+        'height': fallback.height,
+        'alt': image.title if alt is None else alt,
+    }
+    if image.placeholder:
+        img_attrs['style'] = PLACEHOLDER_STYLE.format(image.placeholder)
+    img_attrs.update(attrs)
+
+    webp = [r for r in renditions if r.webp]
+    source = ''
+    if webp:
+        source = format_html(
+            '<source type="image/webp" srcset="{}" sizes="{}">',
+            ', '.join('{} {}w'.format(r.webp.url, r.width) for r in webp), sizes,
+        )
+    return format_html('<picture>{}<img{}></picture>', source, flatatt(img_attrs))
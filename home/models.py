@@ -1,13 +1,14 @@
 from django.db import models
 from django.shortcuts import render
 from django.http import Http404
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 
 from wagtail.core.models import Orderable, Page
 from wagtail.admin.edit_handlers import (FieldPanel, PageChooserPanel,
                                          InlinePanel, MultiFieldPanel)
 
-from core.models import ArticlePage
+from core.models import ArticleCard, ArticlePage, card_image_tags
+from core.page_cache import depends_on, page_tag
+from core.pagination import paginate_by_date
 from modelcluster.fields import ParentalKey
 
 
@@ -46,23 +47,14 @@ class HomePage(Page):
     def get_context(self, request, *args, **kwargs):
         """Adding custom stuff to our context."""
         context = super().get_context(request, *args, **kwargs)
-        all_posts = ArticlePage.objects.live().public().order_by('-date')
-        paginator = Paginator(all_posts, 10)
-        # Try to get the ?page=x value
-        page = request.GET.get("page")
-        try:
-            # If the page exists and the ?page=x is an int
-            posts = paginator.page(page)
-        except PageNotAnInteger:
-            # If the ?page=x is not an int; show the first page
-            posts = paginator.page(1)
-        except EmptyPage:
-            # If the ?page=x is out of range (too high most likely)
-            # Then return the last page
-            posts = paginator.page(paginator.num_pages)
+        all_posts = ArticleCard.objects.filter(is_public=True)
+        depends_on(page_tag(self.pk), 'article_list')
+        # Keyset pagination on (date, id) so deep pages don't OFFSET scan
+        posts = paginate_by_date(request, all_posts, 10,
+                                 count_cache_key='home:article_count')
+        depends_on(*card_image_tags(posts))
 
-        # "posts" will have child pages; you'll need to use .specific in the template
-        # in order to access child properties, such as youtube_video_id and subtitle
+        # "posts" are ArticleCard rows; see includes/article_card.html
         context["posts"] = posts
         return context
 
@@ -1,4 +1,9 @@
+from collections import namedtuple
+
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from django_extensions.db.fields import AutoSlugField
 from modelcluster.fields import ParentalKey
@@ -9,9 +14,21 @@ from wagtail.admin.edit_handlers import (
     FieldPanel,
     PageChooserPanel,
 )
-from wagtail.core.models import Orderable
+from wagtail.core.models import Orderable, Page
+from wagtail.core.signals import page_published, page_unpublished
 from wagtail.snippets.models import register_snippet
 
+from core.page_cache import depends_on, purge
+
+
+# Plain, picklable version of a MenuItem. Templates use the same attribute
+# names as the model properties so they render either one.
+CompiledMenuItem = namedtuple(
+    'CompiledMenuItem', ['title', 'link', 'icon', 'open_in_new_tab'])
+CompiledMenu = namedtuple('CompiledMenu', ['title', 'slug', 'menu_items'])
+
+MENU_CACHE_KEY = 'menus:compiled:{}'
+
 
 class MenuItem(Orderable):
 
@@ -86,4 +103,86 @@ class Menu(ClusterableModel):
     ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def save(self, *args, **kwargs):
+        # ClusterableModel commits the menu items after the menu row itself,
+        # so only drop the compiled copy once everything has been written.
+        super().save(*args, **kwargs)
+        clear_menu_cache(self.slug)
+
+    def compile(self):
+        """Resolve the whole menu into plain tuples, loading linked pages once."""
+        items = self.menu_items.select_related('link_page').order_by('sort_order')
+        return CompiledMenu(
+            title=self.title,
+            slug=self.slug,
+            menu_items=tuple(
+                CompiledMenuItem(
+                    title=item.title,
+                    link=item.link,
+                    icon=item.icon,
+                    open_in_new_tab=item.open_in_new_tab,
+                )
+                for item in items
+            ),
+        )
+
+
+def get_compiled_menu(slug):
+    """Return the compiled menu for ``slug``, building it on a cache miss.
+
+    The compiled menu lives in the shared Django cache with no timeout so
+    every gunicorn worker reuses it; the signal handlers below clear it.
+    """
+    depends_on('menu:{}'.format(slug))
+    key = MENU_CACHE_KEY.format(slug)
+    menu = cache.get(key)
+    if menu is None:
+        menu = Menu.objects.get(slug=slug).compile()
+        cache.set(key, menu, None)
+    return menu
+
+
+def clear_menu_cache(slug=None):
+    if slug is None:
+        slugs = Menu.objects.values_list('slug', flat=True)
+    else:
+        slugs = [slug]
+    cache.delete_many([MENU_CACHE_KEY.format(s) for s in slugs])
+    purge(*('menu:{}'.format(s) for s in slugs))
+
+
+def _page_is_linked(page):
+    # Moving or renaming a page changes the URLs of its descendants as well.
+    return MenuItem.objects.filter(link_page__path__startswith=page.path).exists()
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    clear_menu_cache()
+
+
+@receiver(post_delete, sender=Menu)
+def menu_deleted(sender, instance, **kwargs):
+    clear_menu_cache(instance.slug)
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def linked_page_published(sender, instance, **kwargs):
+    if _page_is_linked(instance):
+        clear_menu_cache()
+
+
+@receiver(post_save)
+def linked_page_moved(sender, instance, created, update_fields=None, **kwargs):
+    # Page.move() re-saves the page with its new url_path. Draft saves only
+    # touch a few bookkeeping fields, so skip those.
+    if created or not isinstance(instance, Page):
+        return
+    if update_fields is not None and 'url_path' not in update_fields:
+        return
+    if _page_is_linked(instance):
+        clear_menu_cache()
\ No newline at end of file
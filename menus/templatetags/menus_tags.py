@@ -1,10 +1,10 @@
 from django import template
 
-from menus.models import Menu
+from menus.models import get_compiled_menu
 
 register = template.Library()
 
 
 @register.simple_tag()
 def get_menu(slug):
-    return Menu.objects.get(slug=slug)
\ No newline at end of file
+    return get_compiled_menu(slug)
\ No newline at end of file
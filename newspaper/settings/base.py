@@ -61,7 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'wagtailcache.cache.UpdateCacheMiddleware',
+    'core.page_cache.UpdateCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,7 +72,7 @@ MIDDLEWARE = [
 
     'wagtail.core.middleware.SiteMiddleware',
     'wagtail.contrib.redirects.middleware.RedirectMiddleware',
-    'wagtailcache.cache.FetchFromCacheMiddleware',
+    'core.page_cache.FetchFromCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'newspaper.urls'
@@ -180,11 +180,44 @@ BASE_URL = 'http://example.com'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'BACKEND': 'core.cache_backends.ShardedFileCache',
         'LOCATION': os.path.join(BASE_DIR, 'cache'),
         'KEY_PREFIX': 'wagtailcache',
         'TIMEOUT': 3600, # one hour (in seconds)
+        'OPTIONS': {
+            'MAX_BYTES': 1024 ** 3, # 1 GB, least recently used pages are evicted past this
+        },
     }
 }
 
+# Page cache stampede protection (see core.page_cache)
+PAGE_CACHE_GRACE = 300 # serve stale pages for up to five minutes while one worker re-renders
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Search hits are counted in memory and saved in batches (see search.hits)
+SEARCH_HITS_FLUSH_INTERVAL = 30 # seconds
+SEARCH_HITS_MAX_BUFFER = 10000 # distinct (query, day) pairs per worker
+
+# Page searches are answered from a local BM25 index (see search.index);
+# rebuild it from scratch with ./manage.py build_search_index
+WAGTAILSEARCH_BACKENDS = {
+    'default': {
+        'BACKEND': 'search.backends',
+    }
+}
+SEARCH_INDEX_DIR = os.path.join(BASE_DIR, 'search_index')
+SEARCH_INDEX_MERGE_THRESHOLD = 500 # pages changed since the last merge
+SEARCH_RESULTS_TIMEOUT = 3600 # result pages are also dropped on every publish
+SEARCH_SUGGEST_PATH = os.path.join(SEARCH_INDEX_DIR, 'suggest.pickle') # ./manage.py build_suggestions
+
+# Renditions in core.renditions.RENDITION_SPECS are generated in background
+# processes on upload; ./manage.py generate_renditions backfills the library
+RENDITION_WORKERS = 2
+
+# Uploaded originals are downscaled and re-encoded before storage (see core.ingest)
+IMAGE_INGEST = {
+    'MAX_EDGE': 2560, # pixels, longest side
+    'JPEG_QUALITY': 88,
+}
+
 WAGTAILIMAGES_IMAGE_MODEL = 'core.CustomImage'
\ No newline at end of file
@@ -1,9 +1,14 @@
 # Based on torchbox implementation
 
+import time
+
+from django.http import Http404
 from django.shortcuts import render
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django import forms
@@ -13,14 +18,17 @@ from wagtail.admin.edit_handlers import (FieldPanel, InlinePanel,
                                          MultiFieldPanel, PageChooserPanel)
 from wagtail.core.fields import RichTextField
 from wagtail.core.models import Orderable, Page
-from wagtail.core.signals import page_published
+from wagtail.core.signals import page_published, page_unpublished
 from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.search import index
 from wagtail.snippets.models import register_snippet
 from wagtail.snippets.edit_handlers import SnippetChooserPanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 
-from core.models import Author # CustomImage
+from core.models import (ArticleCard, AuthorArticle, CustomImage, bibliography_count_key,
+                         card_image_tags)
+from core.page_cache import depends_on, page_tag, purge
+from core.pagination import paginate_by_date
 
 @register_snippet
 class YearsActive(models.Model):
@@ -58,9 +66,8 @@ class StaffPage(RoutablePageMixin, Page):
         return PersonPage.objects.all()
 
     def get_year(self):
-        year = YearsActive.objects.all()
-        latest = year[0].year_string
-        return latest
+        years = get_staff_years()
+        return years[0] if years else None
 
     @property
     def staff_page(self):
@@ -72,19 +79,24 @@ class StaffPage(RoutablePageMixin, Page):
 
     @route(r'^year/(?P<year>[-\w]+)/$', name='year')
     def staff_by_year(self, request, year, *args, **kwargs):
-        context = self.get_context(request, *args, **kwargs)
+        # Only years that exist, so junk URLs don't each cache a roster
+        if year not in get_staff_years():
+            raise Http404
+        context = self.get_context(request, year=year)
         self.search_type = 'year'
         self.search_term = year
-        context['year'] = year
-        context['people'] = PersonPage.objects.filter(role_assignment__year__year_string=year)
         return render(request, "people/staff_page.html", context)
 
-    def get_context(self, request):
+    def get_context(self, request, year=None):
         context = super().get_context(request)
+        depends_on(page_tag(self.pk), 'staff')
         # context['staff_page'] = self,staff_page
-        context['year'] = self.get_year()
-        context['years'] = YearsActive.objects.all()
-        context['people'] = self.get_people().filter(role_assignment__year__year_string=self.get_year()).distinct()
+        context['years'] = get_staff_years()
+        if year is None:
+            year = context['years'][0] if context['years'] else None
+        context['year'] = year
+        context['people'] = get_roster(year)
+        depends_on(*roster_tags(context['people']))
         return context
 
 
@@ -129,6 +141,110 @@ class RoleAssignment(Orderable):
     def __str__(self):
         return self.role.role
 
+
+def load_person_roles(year):
+    """Map PersonPage ids to their role names in ``year`` (a year_string).
+
+    One query for the whole staff list. The names reach staff_page.html
+    through the roster in the view context.
+    """
+    assignments = (
+        RoleAssignment.objects
+        .filter(year__year_string=year)
+        .order_by('page_id', 'sort_order')
+        .values_list('page_id', 'role__role')
+    )
+    person_roles = {}
+    for page_id, role in assignments:
+        person_roles.setdefault(page_id, []).append(role)
+    return person_roles
+
+
+ROSTER_VERSION_KEY = 'staff:roster:version'
+ROSTER_KEY = 'staff:roster:{version}:{year}'
+YEARS_KEY = 'staff:years:{version}'
+
+
+def _roster_version():
+    version = cache.get(ROSTER_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, so an evicted version never comes back as
+        # a number older rosters were cached under
+        version = time.time_ns()
+        cache.add(ROSTER_VERSION_KEY, version, None)
+        version = cache.get(ROSTER_VERSION_KEY, version)
+    return version
+
+
+def clear_rosters():
+    """Drop every cached roster once the change commits; each is rebuilt on its next request.
+
+    Bumping any earlier would let another worker rebuild from the old rows
+    and cache them under the new version.
+    """
+    def bump():
+        try:
+            cache.incr(ROSTER_VERSION_KEY)
+        except ValueError:
+            cache.set(ROSTER_VERSION_KEY, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def get_staff_years():
+    """year_strings of every YearsActive, newest first."""
+    key = YEARS_KEY.format(version=_roster_version())
+    years = cache.get(key)
+    if years is None:
+        years = list(YearsActive.objects.values_list('year_string', flat=True))
+        cache.set(key, years, None)
+    return years
+
+
+def get_roster(year):
+    """The staff list for ``year`` (a year_string), from the cache."""
+    if year is None:
+        return []
+    key = ROSTER_KEY.format(version=_roster_version(), year=year)
+    roster = cache.get(key)
+    if roster is None:
+        roster = build_roster(year)
+        cache.set(key, roster, None)
+    return roster
+
+
+def build_roster(year):
+    """Plain dicts for each live person with a role in ``year``, in tree order.
+
+    Holds everything staff_page.html shows, so a cached roster renders
+    without touching the database.
+    """
+    person_roles = load_person_roles(year)
+    people = (
+        PersonPage.objects.live()
+        .filter(pk__in=person_roles)
+        .select_related('profile_image')
+        .order_by('path')
+    )
+    roster = []
+    for person in people:
+        image = person.profile_image
+        roster.append({
+            'pk': person.pk,
+            'title': person.title,
+            'url': person.url,
+            'roles': person_roles[person.pk],
+            'image_id': image.pk if image else None,
+            'image_url': image.get_rendition('fill-300x200').url if image else '',
+            'image_placeholder': image.placeholder if image else '',
+        })
+    return roster
+
+
+def roster_tags(roster):
+    """Page cache tags for the images a roster shows."""
+    return ['image:{}'.format(person['image_id']) for person in roster if person['image_id']]
+
 class ContactFields(models.Model):
     telephone = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
@@ -210,7 +326,16 @@ class PersonPage(Page, ContactFields):
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
-        posts = Author.objects.filter(author__person_page__slug=self.slug)
+        depends_on(page_tag(self.pk), 'staff')
+        # AuthorArticle rows with their ArticleCard, newest first, a page at a time
+        articles = AuthorArticle.objects.filter(
+            person_page=self, card__is_public=True,
+        ).select_related('card')
+        posts = paginate_by_date(
+            request, articles, 12,
+            count_cache_key=bibliography_count_key(self.pk),
+        )
+        depends_on(*card_image_tags(post.card for post in posts))
         roles = RoleAssignment.objects.filter(page=self)
         context['parent'] = self.staff_page()
         context['roles'] = roles
@@ -270,6 +395,68 @@ class Person(index.Indexed, models.Model):
         ordering = ['name']
 
 
-
-
-
+@receiver(page_published, sender=PersonPage)
+@receiver(page_unpublished, sender=PersonPage)
+@receiver(post_save, sender=YearsActive)
+@receiver(post_delete, sender=YearsActive)
+@receiver(post_save, sender=Roles)
+@receiver(post_delete, sender=Roles)
+def purge_staff_pages(sender, instance, **kwargs):
+    purge('staff')
+
+
+@receiver(page_published, sender=PersonPage)
+@receiver(page_unpublished, sender=PersonPage)
+@receiver(post_delete, sender=PersonPage)
+@receiver(post_save, sender=RoleAssignment)
+@receiver(post_delete, sender=RoleAssignment)
+@receiver(post_save, sender=YearsActive)
+@receiver(post_delete, sender=YearsActive)
+@receiver(post_save, sender=Roles)
+@receiver(post_delete, sender=Roles)
+@receiver(post_save, sender=CustomImage)
+def clear_staff_rosters(sender, instance, **kwargs):
+    clear_rosters()
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def purge_person_pages(sender, instance, **kwargs):
+    purge('person:{}'.format(instance.pk))
+
+
+@receiver(pre_save, sender=Person)
+def remember_person_page(sender, instance, **kwargs):
+    instance._saved_person_page_id = Person.objects.filter(pk=instance.pk).values_list(
+        'person_page_id', flat=True).first()
+
+
+@receiver(post_save, sender=Person)
+def move_person_articles(sender, instance, **kwargs):
+    # Only relinking the person to another page changes their bibliography
+    old, new = getattr(instance, '_saved_person_page_id', None), instance.person_page_id
+    if old == new:
+        return
+    if new:
+        # Left over from a person who was unlinked from the page
+        AuthorArticle.objects.filter(person_page_id=new).delete()
+    if old and new:
+        AuthorArticle.objects.filter(person_page_id=old).update(person_page_id=new)
+    elif old:
+        AuthorArticle.objects.filter(person_page_id=old).delete()
+    else:
+        cards = ArticleCard.objects.filter(page__authors__author=instance).distinct()
+        AuthorArticle.objects.bulk_create([
+            AuthorArticle(person_page_id=new, card=card, date=card.date) for card in cards
+        ])
+    changed = [pk for pk in (old, new) if pk]
+    cache.delete_many([bibliography_count_key(pk) for pk in changed])
+    purge(*(page_tag(pk) for pk in changed))
+
+
+@receiver(post_delete, sender=Person)
+def remove_person_articles(sender, instance, **kwargs):
+    if instance.person_page_id:
+        AuthorArticle.objects.filter(person_page_id=instance.person_page_id).delete()
+        cache.delete(bibliography_count_key(instance.person_page_id))
+        purge(page_tag(instance.person_page_id))
@@ -0,0 +1,76 @@
+"""Wagtail search backend that answers page searches from search.index.
+
+Plain-text searches over pages are ranked by the local BM25 index; the
+candidate ids are then passed through the caller's queryset, so filters such
+as ``live()`` or ``type()`` still apply. Anything else (other models, field
+restrictions, structured queries) falls back to the database backend.
+"""
+from wagtail.core.models import Page
+from wagtail.search.backends.base import BaseSearchResults
+from wagtail.search.backends.db import DatabaseSearchBackend, DatabaseSearchResults
+from wagtail.search.query import PlainText
+
+from search.index import search_index
+from search.text import analyze
+
+
+class IndexSearchResults(BaseSearchResults):
+    supports_facet = False
+
+    def _clone(self):
+        clone = super()._clone()
+        # Slicing and counting clone the results; share the matched ids
+        clone._page_ids = getattr(self, '_page_ids', None)
+        return clone
+
+    def _get_page_ids(self):
+        if getattr(self, '_page_ids', None) is None:
+            compiler = self.query_compiler
+            query = compiler.query
+            if isinstance(query, str):
+                query_string, operator = query, getattr(compiler, 'operator', None)
+            else:
+                query_string, operator = query.query_string, query.operator
+            hits = search_index.search(
+                analyze(query_string),
+                operator=operator or 'or',
+                partial_match=compiler.partial_match,
+            )
+            ranked = [page_id for page_id, score in hits]
+            matching = compiler.queryset.filter(pk__in=ranked).values_list('pk', flat=True)
+            if compiler.order_by_relevance:
+                allowed = set(matching)
+                self._page_ids = [page_id for page_id in ranked if page_id in allowed]
+            else:
+                self._page_ids = list(matching)
+        return self._page_ids
+
+    def _do_search(self):
+        page_ids = self._get_page_ids()[self.start:self.stop]
+        pages = self.query_compiler.queryset.in_bulk(page_ids)
+        return [pages[page_id] for page_id in page_ids if page_id in pages]
+
+    def _do_count(self):
+        return len(self._get_page_ids()[self.start:self.stop])
+
+
+class SearchBackend(DatabaseSearchBackend):
+    def search(self, query, model_or_queryset, fields=None, operator=None,
+               order_by_relevance=True, partial_match=True):
+        results = super().search(
+            query, model_or_queryset, fields=fields, operator=operator,
+            order_by_relevance=order_by_relevance, partial_match=partial_match,
+        )
+        if isinstance(results, DatabaseSearchResults) and self._uses_index(results.query_compiler):
+            return IndexSearchResults(self, results.query_compiler)
+        return results
+
+    def _uses_index(self, compiler):
+        return (
+            issubclass(compiler.queryset.model, Page)
+            and not compiler.fields
+            and isinstance(compiler.query, (str, PlainText))
+        )
+
+
+SearchBackendClass = SearchBackend
@@ -0,0 +1,69 @@
+"""Turn pages into weighted bags of terms for the search index."""
+from collections import Counter
+
+from wagtail.core.models import Page
+
+from core.models import ArticlePage, BasePage
+from people.models import PersonPage
+from search.text import analyze
+
+# Repeating a field's terms is how BM25 weights it
+TITLE_WEIGHT = 3
+SUB_TITLE_WEIGHT = 2
+CATEGORY_WEIGHT = 2
+BODY_WEIGHT = 1
+
+# StreamField values that are not prose
+SKIPPED_BLOCKS = {'HTML'}
+SKIPPED_FIELDS = {'alignment', 'button_url'}
+
+
+def stream_text(stream_value):
+    """All text in a StreamField, read from its stored JSON."""
+    raw = stream_value.stream_block.get_prep_value(stream_value)
+    parts = []
+    for block in raw:
+        if block['type'] not in SKIPPED_BLOCKS:
+            _collect_text(block['value'], parts)
+    return ' '.join(parts)
+
+
+def _collect_text(value, parts):
+    if isinstance(value, str):
+        parts.append(value)
+    elif isinstance(value, dict):
+        for name, child in value.items():
+            if name not in SKIPPED_FIELDS:
+                _collect_text(child, parts)
+    elif isinstance(value, list):
+        for child in value:
+            _collect_text(child, parts)
+
+
+def page_terms(page):
+    """Counter of index terms for a specific page."""
+    terms = Counter()
+
+    def add(text, weight, html=False):
+        if text:
+            for term in analyze(text, html=html):
+                terms[term] += weight
+
+    add(page.title, TITLE_WEIGHT)
+    if isinstance(page, BasePage):
+        add(page.sub_title, SUB_TITLE_WEIGHT)
+        for item in page.article_categories.select_related('article_category'):
+            add(item.article_category.name, CATEGORY_WEIGHT)
+    if isinstance(page, ArticlePage) and page.body:
+        add(stream_text(page.body), BODY_WEIGHT, html=True)
+    if isinstance(page, PersonPage):
+        add(page.intro, BODY_WEIGHT, html=True)
+        add(page.biography, BODY_WEIGHT, html=True)
+    return terms
+
+
+def live_documents():
+    """(page id, terms) for every live page, for a full rebuild."""
+    pages = Page.objects.live().filter(depth__gt=1).specific()
+    for page in pages:
+        yield page.pk, page_terms(page)
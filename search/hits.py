@@ -0,0 +1,112 @@
+"""Buffered search hit recording.
+
+Query.get() followed by add_hit() is a get-or-create plus an update of the
+wagtailsearch daily hits row inside every search request, and popular
+queries turn those rows into write hot spots. Instead, each worker counts
+``(query, date)`` pairs in memory and a background thread writes them out
+periodically as one bulk upsert. The buffer is bounded and flushed when the
+worker exits.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from wagtail.search.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'SEARCH_HITS_FLUSH_INTERVAL', 30)
+MAX_BUFFER = getattr(settings, 'SEARCH_HITS_MAX_BUFFER', 10000)
+
+
+def save_hits(counts):
+    """Add ``{(query_string, date): hits}`` to the daily hits table."""
+    if not counts:
+        return
+    query_strings = {query_string for query_string, day in counts}
+    with transaction.atomic():
+        Query.objects.bulk_create(
+            [Query(query_string=query_string) for query_string in query_strings],
+            ignore_conflicts=True,
+        )
+        query_ids = dict(
+            Query.objects.filter(query_string__in=query_strings)
+            .values_list('query_string', 'id')
+        )
+        table = connection.ops.quote_name(QueryDailyHits._meta.db_table)
+        rows = [
+            (query_ids[query_string], day, hits)
+            for (query_string, day), hits in counts.items()
+        ]
+        sql = (
+            'INSERT INTO {table} (query_id, date, hits) VALUES {values} '
+            'ON CONFLICT (query_id, date) DO UPDATE SET hits = {table}.hits + EXCLUDED.hits'
+        ).format(table=table, values=', '.join(['(%s, %s, %s)'] * len(rows)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+
+
+class HitBuffer:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_size=MAX_BUFFER):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.counts = Counter()
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pid = None
+
+    def record(self, query_string):
+        """Count a hit. Never touches the database."""
+        query_string = normalise_query_string(query_string)
+        if not query_string:
+            return
+        self._ensure_thread()
+        key = (query_string, timezone.now().date())
+        with self.lock:
+            if key not in self.counts and len(self.counts) >= self.max_size:
+                self.dropped += 1
+                self.wake.set()
+                return
+            self.counts[key] += 1
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning("Search hit buffer was full; dropped %d hits", dropped)
+        try:
+            save_hits(counts)
+        except Exception:
+            logger.exception("Could not save %d search hit counts", len(counts))
+
+    def _ensure_thread(self):
+        # Start one flusher per worker process, after gunicorn has forked
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.counts.clear()
+            thread = threading.Thread(target=self._run, name='search-hits', daemon=True)
+            thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+            connection.close()
+
+
+hit_buffer = HitBuffer()
@@ -0,0 +1,392 @@
+"""On-disk inverted index with BM25 ranking.
+
+The index is one immutable segment file, memory-mapped read-only by every
+worker, plus a small delta file holding pages published or unpublished since
+the segment was written. Once the delta grows past ``MERGE_THRESHOLD`` pages
+a background thread merges it into a new segment, which replaces the old one
+atomically; publishing never waits for a merge.
+
+Segment layout (little endian)::
+
+    header    magic, doc count, term count, average doc length, section offsets
+    docs      page ids (uint32) for every document, then their lengths (uint32)
+    terms     (blob offset uint32, blob length uint16, df uint32,
+               postings offset uint64) per term, sorted by term bytes
+    blob      UTF-8 term text
+    postings  per term: df doc numbers (uint32) then df term weights (uint16)
+"""
+import fcntl
+import math
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+
+MAGIC = b'NPIDX001'
+HEADER = struct.Struct('<8sIId4Q')
+TERM = struct.Struct('<IHIQ')
+
+K1 = 1.2
+B = 0.75
+# Highest-scoring pages handed back to the database for filtering
+MAX_RESULTS = 1000
+# A trailing partial word of at least MIN_PREFIX characters is expanded to
+# the first MAX_PREFIX_TERMS indexed terms it starts
+MIN_PREFIX = 3
+MAX_PREFIX_TERMS = 10
+MERGE_THRESHOLD = getattr(settings, 'SEARCH_INDEX_MERGE_THRESHOLD', 500)
+INDEX_DIR = getattr(
+    settings, 'SEARCH_INDEX_DIR',
+    os.path.join(getattr(settings, 'BASE_DIR', '.'), 'search_index'),
+)
+
+
+def write_segment(path, docs):
+    """Write a segment for ``docs``, an iterable of (page id, Counter of terms)."""
+    page_ids = array('I')
+    lengths = array('I')
+    postings = {}
+    for number, (page_id, terms) in enumerate(docs):
+        page_ids.append(page_id)
+        lengths.append(sum(terms.values()))
+        for term, weight in terms.items():
+            postings.setdefault(term.encode(), []).append((number, min(weight, 0xFFFF)))
+
+    terms = sorted(postings)
+    doc_count = len(page_ids)
+    avg_length = sum(lengths) / doc_count if doc_count else 0.0
+
+    docs_offset = HEADER.size
+    terms_offset = docs_offset + 8 * doc_count
+    blob_offset = terms_offset + TERM.size * len(terms)
+    postings_offset = blob_offset + sum(len(term) for term in terms)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with open(fd, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, doc_count, len(terms), avg_length,
+                docs_offset, terms_offset, blob_offset, postings_offset,
+            ))
+            f.write(page_ids.tobytes())
+            f.write(lengths.tobytes())
+            blob_position = 0
+            postings_position = 0
+            for term in terms:
+                f.write(TERM.pack(blob_position, len(term), len(postings[term]), postings_position))
+                blob_position += len(term)
+                postings_position += 6 * len(postings[term])
+            f.writelines(terms)
+            for term in terms:
+                entries = postings[term]
+                f.write(array('I', (number for number, weight in entries)).tobytes())
+                f.write(array('H', (weight for number, weight in entries)).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Segment:
+    """Read-only view of a segment file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.doc_count, self.term_count, self.avg_length,
+         self.docs_offset, self.terms_offset, self.blob_offset,
+         self.postings_offset) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a search index segment".format(path))
+        # Per-document values are small enough to keep as arrays, and the
+        # BM25 length normalisation only has to be worked out once.
+        start = self.docs_offset
+        self.page_ids = array('I')
+        self.page_ids.frombytes(self.mm[start:start + 4 * self.doc_count])
+        lengths = array('I')
+        lengths.frombytes(self.mm[start + 4 * self.doc_count:start + 8 * self.doc_count])
+        self.lengths = lengths
+        self.norms = array('d', (_norm(length, self.avg_length) for length in lengths))
+
+    def _term_at(self, position):
+        blob_start, blob_length, df, postings_start = TERM.unpack_from(
+            self.mm, self.terms_offset + TERM.size * position)
+        start = self.blob_offset + blob_start
+        return self.mm[start:start + blob_length], df, postings_start
+
+    def _bisect(self, term):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_at(middle)[0] < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, term):
+        """Return (df, postings start) for ``term``, or None."""
+        term = term.encode()
+        position = self._bisect(term)
+        if position < self.term_count:
+            found, df, postings_start = self._term_at(position)
+            if found == term:
+                return df, postings_start
+        return None
+
+    def prefix(self, prefix, limit=MAX_PREFIX_TERMS):
+        """Terms starting with ``prefix``, in byte order."""
+        prefix = prefix.encode()
+        position = self._bisect(prefix)
+        terms = []
+        while position < self.term_count and len(terms) < limit:
+            term = self._term_at(position)[0]
+            if not term.startswith(prefix):
+                break
+            terms.append(term.decode())
+            position += 1
+        return terms
+
+    def postings(self, df, postings_start):
+        start = self.postings_offset + postings_start
+        numbers = array('I')
+        numbers.frombytes(self.mm[start:start + 4 * df])
+        weights = array('H')
+        weights.frombytes(self.mm[start + 4 * df:start + 6 * df])
+        return numbers, weights
+
+    def documents(self):
+        """Yield (page id, Counter of terms) for every document (for merges)."""
+        terms_by_doc = [Counter() for number in range(self.doc_count)]
+        for position in range(self.term_count):
+            term, df, postings_start = self._term_at(position)
+            term = term.decode()
+            numbers, weights = self.postings(df, postings_start)
+            for number, weight in zip(numbers, weights):
+                terms_by_doc[number][term] = weight
+        for page_id, terms in zip(self.page_ids, terms_by_doc):
+            yield page_id, terms
+
+    def close(self):
+        self.mm.close()
+
+
+class SearchIndex:
+    """The segment plus its delta, reloaded when another process changes them."""
+
+    def __init__(self, directory=INDEX_DIR):
+        self.directory = directory
+        self.segment_path = os.path.join(directory, 'pages.idx')
+        self.delta_path = os.path.join(directory, 'pages.delta')
+        self.lock_path = os.path.join(directory, 'pages.lock')
+        self.merge_lock_path = os.path.join(directory, 'pages.merge.lock')
+        self.segment = None
+        self.delta = {'docs': {}, 'deleted': set()}
+        self._delta_stat = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    # Reading
+
+    def _refresh(self):
+        # stat() at most once a second; other workers write new files by rename
+        now = time.monotonic()
+        if now - self._checked < 1:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                stat = os.stat(self.segment_path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None:
+                self.segment = None
+            elif self.segment is None or self.segment.stat.st_ino != stat.st_ino:
+                old, self.segment = self.segment, Segment(self.segment_path)
+                if old is not None:
+                    old.close()
+            try:
+                stat = os.stat(self.delta_path)
+                key = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                key = None
+            if key != self._delta_stat:
+                self.delta = self._read_delta()
+                self._delta_stat = key
+
+    def _read_delta(self):
+        try:
+            with open(self.delta_path, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {'docs': {}, 'deleted': set()}
+
+    def expand(self, term):
+        """Terms in the index that start with ``term``."""
+        terms = set()
+        if self.segment is not None:
+            terms.update(self.segment.prefix(term))
+        for doc_terms in self.delta['docs'].values():
+            terms.update(t for t in doc_terms if t.startswith(term))
+        return sorted(terms)[:MAX_PREFIX_TERMS]
+
+    def search(self, terms, operator='or', partial_match=False, limit=MAX_RESULTS):
+        """Return [(page id, score)] for ``terms``, best first.
+
+        ``terms`` are already analysed. With ``partial_match`` the last term
+        also matches any indexed term it is a prefix of.
+        """
+        self._refresh()
+        if not terms:
+            return []
+        segment = self.segment
+        delta_docs = self.delta['docs']
+        hidden = self.delta['deleted'] | set(delta_docs)
+
+        doc_count = (segment.doc_count if segment else 0) + len(delta_docs)
+        if not doc_count:
+            return []
+        avg_length = segment.avg_length if segment and segment.avg_length else (
+            sum(sum(t.values()) for t in delta_docs.values()) / len(delta_docs))
+
+        groups = [[term] for term in terms]
+        if partial_match and len(terms[-1]) >= MIN_PREFIX:
+            groups[-1] = sorted(set(groups[-1] + self.expand(terms[-1])))
+
+        scores = Counter()
+        matched = Counter()
+        for group in groups:
+            group_scores = {}
+            for term in group:
+                lookup = segment.lookup(term) if segment else None
+                delta_df = sum(1 for t in delta_docs.values() if term in t)
+                df = (lookup[0] if lookup else 0) + delta_df
+                if not df:
+                    continue
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                boost = idf * (K1 + 1)
+                if lookup:
+                    numbers, weights = segment.postings(*lookup)
+                    page_ids, norms = segment.page_ids, segment.norms
+                    for number, weight in zip(numbers, weights):
+                        page_id = page_ids[number]
+                        if page_id in hidden:
+                            continue
+                        score = boost * weight / (weight + norms[number])
+                        if score > group_scores.get(page_id, 0):
+                            group_scores[page_id] = score
+                for page_id, doc_terms in delta_docs.items():
+                    if term in doc_terms:
+                        weight = doc_terms[term]
+                        norm = _norm(sum(doc_terms.values()), avg_length)
+                        group_scores[page_id] = max(
+                            group_scores.get(page_id, 0), boost * weight / (weight + norm))
+            for page_id, score in group_scores.items():
+                scores[page_id] += score
+                matched[page_id] += 1
+
+        if operator == 'and':
+            scores = Counter({
+                page_id: score for page_id, score in scores.items()
+                if matched[page_id] == len(groups)
+            })
+        return scores.most_common(limit)
+
+    # Writing
+
+    def _locked(self, path=None, blocking=True):
+        """Open and flock ``path``; None if ``blocking`` is False and it is held."""
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(path or self.lock_path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _write_delta(self, delta):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with open(fd, 'wb') as f:
+            pickle.dump(delta, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.delta_path)
+
+    def update(self, page_id, terms=None):
+        """Add or replace a page's terms, or remove it when ``terms`` is None."""
+        with self._locked():
+            delta = self._read_delta()
+            if terms:
+                delta['docs'][page_id] = terms
+                delta['deleted'].discard(page_id)
+            else:
+                delta['docs'].pop(page_id, None)
+                delta['deleted'].add(page_id)
+            self._write_delta(delta)
+        self._checked = 0
+        if len(delta['docs']) + len(delta['deleted']) >= MERGE_THRESHOLD:
+            threading.Thread(target=self.merge, name='search-merge', daemon=True).start()
+
+    def merge(self):
+        """Fold the delta into a new segment.
+
+        The new segment is built from a snapshot of the delta without holding
+        the update lock. Pages changed again in the meantime stay in the delta,
+        which takes precedence over the segment. Only one merge runs at a time.
+        """
+        merge_lock = self._locked(self.merge_lock_path, blocking=False)
+        if merge_lock is None:
+            return
+        with merge_lock:
+            with self._locked():
+                snapshot = self._read_delta()
+            hidden = snapshot['deleted'] | set(snapshot['docs'])
+            docs = []
+            if os.path.exists(self.segment_path):
+                segment = Segment(self.segment_path)
+                try:
+                    docs = [(page_id, terms) for page_id, terms in segment.documents()
+                            if page_id not in hidden]
+                finally:
+                    segment.close()
+            docs.extend(snapshot['docs'].items())
+            next_path = self.segment_path + '.next'
+            write_segment(next_path, docs)
+
+            with self._locked():
+                delta = self._read_delta()
+                for page_id, terms in snapshot['docs'].items():
+                    if delta['docs'].get(page_id) == terms:
+                        del delta['docs'][page_id]
+                delta['deleted'] -= snapshot['deleted']
+                os.replace(next_path, self.segment_path)
+                self._write_delta(delta)
+        self._checked = 0
+
+    def rebuild(self, docs):
+        """Replace the whole index with ``docs`` (page id, Counter of terms)."""
+        with self._locked(self.merge_lock_path):
+            next_path = self.segment_path + '.next'
+            write_segment(next_path, docs)
+            with self._locked():
+                os.replace(next_path, self.segment_path)
+                self._write_delta({'docs': {}, 'deleted': set()})
+        self._checked = 0
+
+
+def _norm(length, avg_length):
+    """BM25's document length normalisation, k1 * (1 - b + b * |d| / avgdl)."""
+    return K1 * (1 - B + B * length / avg_length) if avg_length else K1
+
+
+search_index = SearchIndex()
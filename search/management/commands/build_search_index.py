@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from search.documents import live_documents
+from search.index import search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the local search index from every live page."
+
+    def handle(self, *args, **options):
+        docs = list(live_documents())
+        search_index.rebuild(docs)
+        self.stdout.write(self.style.SUCCESS("Indexed {} pages.".format(len(docs))))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from search.suggest import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the search-as-you-type suggestions from live pages, people, "
+        "categories and recent popular queries. Run it regularly (e.g. hourly) "
+        "so query popularity stays current."
+    )
+
+    def handle(self, *args, **options):
+        count = suggestions.rebuild()
+        self.stdout.write(self.style.SUCCESS("Built {} suggestions.".format(count)))
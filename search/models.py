@@ -0,0 +1,92 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wagtail.core.models import Page
+from wagtail.core.signals import page_published, page_unpublished
+
+from core.models import ArticleCategory, url_path_changed
+from people.models import Person
+from search.documents import page_terms
+from search.index import search_index
+from search.results import bump_generation
+from search.suggest import category_entry, page_entry, person_entry, suggestions
+
+logger = logging.getLogger(__name__)
+
+
+def update_page(page, live=True):
+    # A full disk or unwritable index must not stop editors publishing
+    try:
+        search_index.update(page.pk, page_terms(page) if live else None)
+        suggestions.set(('page', page.pk), page_entry(page) if live else None)
+    except OSError:
+        logger.exception("Could not update the search index for page %d", page.pk)
+
+
+def update_suggestion(ident, entry=None):
+    try:
+        suggestions.set(ident, entry)
+    except OSError:
+        logger.exception("Could not update search suggestions for %s", ident)
+
+
+@receiver(page_published)
+def index_published_page(sender, instance, **kwargs):
+    update_page(instance)
+    bump_generation()
+
+
+@receiver(page_unpublished)
+@receiver(post_delete)
+def remove_unpublished_page(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        update_page(instance, live=False)
+        bump_generation()
+
+
+@receiver(post_save)
+def update_moved_page(sender, instance, created, update_fields=None, **kwargs):
+    # Page.move() re-saves the page with its new url_path
+    if created or not isinstance(instance, Page):
+        return
+    if update_fields is not None and 'url_path' not in update_fields:
+        return
+    if not url_path_changed(instance):
+        return
+    # Descendants get their new url_paths after this signal
+    old_prefix = instance._saved_url_path
+    for page in Page.objects.live().filter(path__startswith=instance.path):
+        if page.url_path.startswith(old_prefix):
+            page.url_path = instance.url_path + page.url_path[len(old_prefix):]
+        update_suggestion(('page', page.pk), page_entry(page))
+
+
+@receiver(post_save, sender=ArticleCategory)
+def reindex_category_pages(sender, instance, created, **kwargs):
+    update_suggestion(('category', instance.pk), category_entry(instance))
+    if created:
+        return
+    # Category names are indexed with every article filed under them
+    pages = Page.objects.live().filter(
+        basepage__article_categories__article_category=instance,
+    ).specific()
+    for page in pages:
+        update_page(page)
+    bump_generation()
+
+
+@receiver(post_delete, sender=ArticleCategory)
+def remove_category_suggestion(sender, instance, **kwargs):
+    update_suggestion(('category', instance.pk))
+
+
+@receiver(post_save, sender=Person)
+def update_person_suggestion(sender, instance, **kwargs):
+    update_suggestion(('person', instance.pk), person_entry(instance))
+
+
+@receiver(post_delete, sender=Person)
+def remove_person_suggestion(sender, instance, **kwargs):
+    update_suggestion(('person', instance.pk))
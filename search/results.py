@@ -0,0 +1,89 @@
+"""Cached search result pages.
+
+Most /search/ traffic is a handful of repeated queries. Each page of results
+is cached as the matching page ids plus the total count, keyed by the
+normalised query string and page number, so a repeat skips the backend and
+the paginator count and costs one ``in_bulk``. Every key includes a
+generation number which is bumped whenever any page is published,
+unpublished or deleted, so cached results are never stale.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page as PaginatorPage, PageNotAnInteger, Paginator
+
+from wagtail.core.models import Page
+
+from core.page_cache import purge
+
+PER_PAGE = 10
+RESULTS_TIMEOUT = getattr(settings, 'SEARCH_RESULTS_TIMEOUT', 3600)
+GENERATION_KEY = 'search:generation'
+RESULTS_KEY = 'search:results:{generation}:{number}:{query}'
+
+
+def normalise(query_string):
+    """Case-fold and collapse whitespace, so equivalent queries share entries."""
+    return ' '.join(query_string.casefold().split())
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Invalidate every cached result page, and the cached /search/ responses."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+    purge('search')
+
+
+def _results_key(query_string, number):
+    return RESULTS_KEY.format(
+        generation=get_generation(),
+        number=number,
+        query=hashlib.md5(query_string.encode()).hexdigest(),
+    )
+
+
+def search_page(query_string, number=1, per_page=PER_PAGE):
+    """Return the paginator page of live pages matching ``query_string``.
+
+    Bad page numbers give the first page and numbers past the end give the
+    last, as the view always did.
+    """
+    query_string = normalise(query_string)
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 1
+    key = _results_key(query_string, number)
+    entry = cache.get(key)
+    if entry is None:
+        paginator = Paginator(Page.objects.live().search(query_string), per_page)
+        try:
+            page = paginator.page(number)
+        except PageNotAnInteger:
+            page = paginator.page(1)
+        except EmptyPage:
+            page = paginator.page(paginator.num_pages)
+        entry = {
+            'number': page.number,
+            'count': paginator.count,
+            'ids': [result.pk for result in page.object_list],
+        }
+        cache.set(key, entry, RESULTS_TIMEOUT)
+
+    pages = Page.objects.in_bulk(entry['ids'])
+    paginator = Paginator((), per_page)
+    paginator.count = entry['count']
+    return PaginatorPage(
+        [pages[pk] for pk in entry['ids'] if pk in pages], entry['number'], paginator,
+    )
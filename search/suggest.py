@@ -0,0 +1,254 @@
+"""Search-as-you-type suggestions.
+
+Suggestions come from live page titles, people, category names and popular
+recorded queries. They are held in a sorted array of normalised keys and
+found by binary search. Every word start in a label gets its own key, so
+"smi" finds "John Smith". Most one- and two-letter prefixes match thousands
+of keys, so their best suggestions are worked out in advance.
+
+The structure is pickled to ``SEARCH_SUGGEST_PATH``. Workers load that file
+on their first lookup and reload it when another process replaces it, so
+they never build suggestions from the database themselves. Publishing a page
+or saving a person or category updates the snapshot in place. Query
+popularity changes all the time, so ``./manage.py build_suggestions`` does a
+full rebuild and should run regularly.
+"""
+import fcntl
+import heapq
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from unidecode import unidecode
+
+from wagtail.core.models import Page
+from wagtail.search.models import QueryDailyHits
+
+from core.models import ArticleCategory
+from people.models import Person
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+SUGGEST_PATH = getattr(
+    settings, 'SEARCH_SUGGEST_PATH',
+    os.path.join(getattr(settings, 'BASE_DIR', '.'), 'search_index', 'suggest.pickle'),
+)
+LIMIT = 10
+# Prefixes up to this length have precomputed answers
+TOP_PREFIX_LENGTH = 2
+# Longer prefixes rank at most this many matching keys
+MAX_SCAN = 5000
+# Recorded queries are suggested once they have this many hits in the window
+QUERY_MIN_HITS = 3
+QUERY_WINDOW_DAYS = 30
+MAX_QUERIES = 5000
+# Tie-break order for equally popular suggestions
+KIND_ORDER = {'page': 0, 'person': 1, 'category': 2, 'query': 3}
+
+
+def normalise(text):
+    return ' '.join(WORD_RE.findall(unidecode(text).lower()))
+
+
+def word_starts(key):
+    """``key`` and every suffix of it that starts a word."""
+    if not key:
+        return []
+    words = key.split(' ')
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class Suggestions:
+    def __init__(self, path=SUGGEST_PATH):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.data = self._empty()
+        self._stat = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty():
+        # keys and owners are parallel sorted arrays; owners index entries
+        return {'keys': [], 'owners': [], 'entries': {}, 'popularity': {}, 'top': {}}
+
+    # Lookups
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < 1:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                stat = os.stat(self.path)
+                key = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                key = None
+            if key != self._stat:
+                self.data = self._read()
+                self._stat = key
+
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return self._empty()
+
+    def lookup(self, text, limit=LIMIT):
+        """Return up to ``limit`` entries (dicts) for the typed ``text``."""
+        self._refresh()
+        prefix = normalise(text)
+        if not prefix:
+            return []
+        data = self.data
+        if len(prefix) <= TOP_PREFIX_LENGTH:
+            idents = data['top'].get(prefix, [])
+        else:
+            idents = _best(data, prefix, limit)
+        entries = data['entries']
+        return [entries[ident] for ident in idents[:limit]]
+
+    # Building
+
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.lock_path, 'a')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def _write(self, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with open(fd, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._checked = 0
+
+    def rebuild(self):
+        """Build every suggestion from the database and replace the snapshot."""
+        data = self._empty()
+        data['popularity'] = query_popularity()
+        entries = {}
+        for page in Page.objects.live().filter(depth__gt=1).specific():
+            entries[('page', page.pk)] = page_entry(page)
+        for person in Person.objects.select_related('person_page'):
+            entries[('person', person.pk)] = person_entry(person)
+        for category in ArticleCategory.objects.all():
+            entries[('category', category.pk)] = category_entry(category)
+
+        labels = {normalise(entry['label']) for entry in entries.values()}
+        for key, hits in data['popularity'].items():
+            # Queries that are just a title already rank that title
+            if key not in labels:
+                entries[('query', key)] = {'label': key, 'url': None, 'type': 'query'}
+
+        rows = []
+        for ident, entry in entries.items():
+            _score(data, entry)
+            for key in word_starts(normalise(entry['label'])):
+                rows.append((key, ident))
+        rows.sort(key=lambda row: row[0])
+        data['keys'] = [key for key, ident in rows]
+        data['owners'] = [ident for key, ident in rows]
+        data['entries'] = entries
+        data['top'] = {}
+        for key in data['keys']:
+            for length in range(1, TOP_PREFIX_LENGTH + 1):
+                prefix = key[:length]
+                if prefix not in data['top']:
+                    data['top'][prefix] = _best(data, prefix, LIMIT, scan=None)
+        with self._locked():
+            self._write(data)
+        return len(entries)
+
+    def set(self, ident, entry=None):
+        """Add, replace or (with no ``entry``) remove one suggestion."""
+        with self._locked():
+            data = self._read()
+            touched = set()
+            old = data['entries'].pop(ident, None)
+            if old is not None:
+                keys, owners = [], []
+                for key, owner in zip(data['keys'], data['owners']):
+                    if owner != ident:
+                        keys.append(key)
+                        owners.append(owner)
+                data['keys'], data['owners'] = keys, owners
+                touched.update(word_starts(normalise(old['label'])))
+            if entry is not None:
+                _score(data, entry)
+                data['entries'][ident] = entry
+                for key in word_starts(normalise(entry['label'])):
+                    position = bisect_left(data['keys'], key)
+                    data['keys'].insert(position, key)
+                    data['owners'].insert(position, ident)
+                    touched.add(key)
+            for prefix in {key[:length] for key in touched
+                           for length in range(1, TOP_PREFIX_LENGTH + 1)}:
+                best = _best(data, prefix, LIMIT, scan=None)
+                if best:
+                    data['top'][prefix] = best
+                else:
+                    data['top'].pop(prefix, None)
+            self._write(data)
+
+
+def _score(data, entry):
+    entry['score'] = data['popularity'].get(normalise(entry['label']), 0)
+
+
+def _best(data, prefix, limit, scan=MAX_SCAN):
+    """The ``limit`` best-ranked idents with a key starting with ``prefix``."""
+    keys = data['keys']
+    start = bisect_left(keys, prefix)
+    stop = bisect_left(keys, prefix + '\x7f', start)
+    if scan is not None:
+        stop = min(stop, start + scan)
+    entries = data['entries']
+    idents = set(data['owners'][start:stop])
+    return heapq.nsmallest(limit, idents, key=lambda ident: (
+        -entries[ident]['score'], KIND_ORDER[entries[ident]['type']], entries[ident]['label'],
+    ))
+
+
+def query_popularity():
+    """{normalised query: hits} for recently popular recorded searches."""
+    since = timezone.now().date() - timedelta(days=QUERY_WINDOW_DAYS)
+    rows = (
+        QueryDailyHits.objects.filter(date__gte=since)
+        .values('query__query_string')
+        .annotate(total=Sum('hits'))
+        .filter(total__gte=QUERY_MIN_HITS)
+        .order_by('-total')[:MAX_QUERIES]
+    )
+    popularity = {}
+    for row in rows:
+        key = normalise(row['query__query_string'])
+        if key:
+            popularity[key] = popularity.get(key, 0) + row['total']
+    return popularity
+
+
+def page_entry(page):
+    return {'label': page.title, 'url': page.url, 'type': 'page'}
+
+
+def person_entry(person):
+    url = person.person_page.url if person.person_page_id else None
+    return {'label': person.name, 'url': url, 'type': 'person'}
+
+
+def category_entry(category):
+    return {'label': category.name, 'url': None, 'type': 'category'}
+
+
+suggestions = Suggestions()
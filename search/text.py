@@ -0,0 +1,67 @@
+"""Tokenising and stemming for the local search index."""
+import re
+
+from django.utils.html import strip_tags
+from unidecode import unidecode
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it
+its of on or our she so than that the their them then there these they this
+to was we were what when which who will with you your
+""".split())
+
+# (suffix, replacement, minimum stem length) tried longest first
+SUFFIXES = (
+    ('ational', 'ate', 2), ('fulness', 'ful', 2), ('iveness', 'ive', 2),
+    ('ization', 'ize', 2), ('ousness', 'ous', 2),
+    ('ation', 'ate', 2), ('ement', '', 3), ('ments', '', 3), ('ities', '', 3),
+    ('iness', 'y', 2), ('ingly', '', 3),
+    ('ment', '', 3), ('ness', '', 3), ('able', '', 3), ('ible', '', 3),
+    ('ings', '', 3), ('ally', 'al', 2), ('edly', '', 3), ('ies', 'y', 2),
+    ('ing', '', 3), ('ity', '', 3), ('ive', '', 3), ('ful', '', 3),
+    ('ous', '', 3), ('ers', '', 3), ('est', '', 3), ('ize', '', 3),
+    ('ed', '', 3), ('er', '', 3), ('ly', '', 3), ('es', '', 3),
+    ('s', '', 3),
+)
+
+
+def stem(word):
+    """A light English suffix stripper.
+
+    Much simpler than Porter's algorithm, but it folds the plurals and verb
+    forms that matter for headline search ("elections" / "election",
+    "playing" / "played" / "play") and always maps a word the same way, which
+    is all the index needs.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, replacement, min_stem in SUFFIXES:
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if suffix == 'es' and not base.endswith(('s', 'x', 'z', 'ch', 'sh')):
+                # "games" -> "game", but "classes" -> "class"
+                base, suffix = word[:-1], 's'
+            if suffix == 's' and word.endswith(('ss', 'us', 'is')):
+                return word
+            if len(base) >= min_stem:
+                base += replacement
+                # "running" -> "runn" -> "run"
+                if len(base) > 3 and base[-1] == base[-2] and base[-1] not in 'lsz':
+                    base = base[:-1]
+                return base
+    return word
+
+
+def tokenize(text):
+    """Lower-case ASCII words from ``text``, without stop words."""
+    text = unidecode(text).lower()
+    return [token for token in TOKEN_RE.findall(text) if token not in STOP_WORDS]
+
+
+def analyze(text, html=False):
+    """Stemmed terms for ``text``, in order."""
+    if html:
+        text = strip_tags(text)
+    return [stem(token) for token in tokenize(text)]
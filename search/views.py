@@ -1,34 +1,48 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from urllib.parse import urlencode
+
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 
-from wagtail.core.models import Page
-from wagtail.search.models import Query
+from core.page_cache import depends_on
+from search.hits import hit_buffer
+from search.results import PER_PAGE, search_page
+from search.suggest import LIMIT, suggestions
 
 
 def search(request):
     search_query = request.GET.get('query', None)
     page = request.GET.get('page', 1)
+    # The page cache drops these responses with the result pages; see bump_generation
+    depends_on('search')
 
-    # Search
+    # Search (result pages are cached until the next publish)
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
+        search_results = search_page(search_query, page)
 
-        # Record hit
-        query.add_hit()
+        # Record hit (buffered, written out in the background)
+        hit_buffer.record(search_query)
     else:
-        search_results = Page.objects.none()
-
-    # Pagination
-    paginator = Paginator(search_results, 10)
-    try:
-        search_results = paginator.page(page)
-    except PageNotAnInteger:
-        search_results = paginator.page(1)
-    except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+        search_results = Paginator((), PER_PAGE).page(1)
 
     return render(request, 'search/search.html', {
         'search_query': search_query,
         'search_results': search_results,
     })
+
+
+def suggest(request):
+    """JSON suggestions for a partly typed query (``?query=``)."""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', LIMIT)), LIMIT))
+    except ValueError:
+        limit = LIMIT
+    search_url = reverse('search')
+    results = []
+    for entry in suggestions.lookup(request.GET.get('query', ''), limit):
+        url = entry['url'] or '{}?{}'.format(search_url, urlencode({'query': entry['label']}))
+        results.append({'label': entry['label'], 'url': url, 'type': entry['type']})
+    response = JsonResponse({'suggestions': results})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
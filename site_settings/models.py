@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
 from wagtail.core import blocks
 from wagtail.admin.edit_handlers import FieldPanel, MultiFieldPanel
@@ -6,6 +8,7 @@ from wagtail.contrib.settings.models import BaseSetting, register_setting
 from wagtail.images.edit_handlers import ImageChooserPanel
 
 from core.models import CustomImage
+from core.page_cache import purge
 
 @register_setting
 class SocialMediaSettings(BaseSetting):
@@ -44,3 +47,10 @@ class MainSiteSettings(BaseSetting):
     panels = [
         ImageChooserPanel('small_logo'),
     ]
+
+
+@receiver(post_save, sender=SocialMediaSettings)
+@receiver(post_save, sender=MainSiteSettings)
+def purge_settings_pages(sender, instance, **kwargs):
+    # Settings show up on every page
+    purge('settings')